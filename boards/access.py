@@ -0,0 +1,170 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from .models import Board, BoardAccess
+from .queries import accessible_boards
+
+
+OWNER = BoardAccess.OWNER
+MEMBER = BoardAccess.MEMBER
+# Absence d'accès, mise en cache elle aussi (None signifie « absent du cache »)
+NO_ACCESS = ""
+
+
+def _generation_key(board_id):
+    return f"boards:access-gen:{board_id}"
+
+
+def _role_key(user, board_id, generation):
+    # date_joined distingue deux utilisateurs qui réutiliseraient le même id
+    return f"boards:access:{board_id}:g{generation}:{user.pk}:{user.date_joined.timestamp()}"
+
+
+def _cached_role(user, board_id):
+    """Clé du rôle en cache et rôle lu (None si absent du cache)."""
+    generation = cache.get_or_set(_generation_key(board_id), time.time_ns, timeout=None)
+    key = _role_key(user, board_id, generation)
+    return key, cache.get(key)
+
+
+def _store_role(key, role):
+    # role None : pas d'accès (le tableau n'existe pas ou l'utilisateur n'en est pas membre)
+    role = role or NO_ACCESS
+    cache.set(key, role, getattr(settings, "BOARD_ACCESS_CACHE_TIMEOUT", 300))
+    return role
+
+
+def board_role(user, board_id):
+    """
+    Rôle de `user` sur le tableau : OWNER, MEMBER ou None.
+
+    Partagé par les vues HTTP et le consumer WebSocket : le résultat (absence
+    d'accès comprise) est mis en cache par utilisateur, sous une génération
+    propre au tableau que `invalidate_board_access` renouvelle à chaque
+    changement de membres ou suppression du tableau.
+    """
+    if not user or not user.is_authenticated:
+        return None
+    key, role = _cached_role(user, board_id)
+    if role is None:
+        role = _store_role(
+            key, accessible_boards(user).filter(pk=board_id).values_list("accesses__role", flat=True).first()
+        )
+    return role or None
+
+
+class BoardContext:
+    """
+    Tableau résolu pour une requête : le rôle de l'utilisateur et le tableau
+    (avec son propriétaire), chargé à la première lecture seulement.
+    """
+
+    def __init__(self, board_id, role, board=None):
+        self.board_id = board_id
+        self.role = role
+        if board is not None:
+            self.__dict__["board"] = board
+
+    @property
+    def is_owner(self):
+        return self.role == OWNER
+
+    @cached_property
+    def board(self):
+        board = Board.objects.select_related("owner").filter(pk=self.board_id).first()
+        if board is None:
+            # Supprimé depuis la mise en cache du rôle
+            raise Http404("No Board matches the given query.")
+        return board
+
+
+def resolve_board(request, board_id):
+    """
+    Rôle et tableau de l'utilisateur pour `board_id`, résolus une fois par
+    requête et mémorisés sur `request` ; Http404 sans accès.
+
+    Rôle en cache : aucune requête, le tableau n'est lu que si la vue s'en
+    sert (une requête par clé primaire). Sinon une seule requête lit le
+    tableau avec le contrôle d'accès et met le rôle en cache.
+    """
+    resolved = request.__dict__.setdefault("_resolved_boards", {})
+    context = resolved.get(board_id)
+    if context is None:
+        context = resolved[board_id] = _resolve(request.user, board_id)
+    if not context.role:
+        raise Http404("No Board matches the given query.")
+    return context
+
+
+def _resolve(user, board_id):
+    if not user or not user.is_authenticated:
+        return BoardContext(board_id, None)
+    key, role = _cached_role(user, board_id)
+    if role is not None:
+        return BoardContext(board_id, role or None)
+    board = (
+        accessible_boards(user)
+        .select_related("owner")
+        .filter(pk=board_id)
+        .annotate(access_role=F("accesses__role"))
+        .first()
+    )
+    role = _store_role(key, board.access_role if board else None)
+    return BoardContext(board_id, role or None, board)
+
+
+def sync_board_access(board_ids):
+    """
+    Recalcule les lignes BoardAccess des tableaux `board_ids` depuis
+    Board.owner et Board.members (le propriétaire l'emporte s'il est aussi
+    membre). Renvoie `(écrites, supprimées)`.
+    """
+    board_ids = list(board_ids)
+    wanted = {}
+    for board_id, owner_id in Board.objects.filter(pk__in=board_ids).values_list("id", "owner_id"):
+        wanted[board_id, owner_id] = OWNER
+    members = Board.members.through.objects.filter(board_id__in=board_ids).values_list("board_id", "user_id")
+    for board_id, user_id in members:
+        wanted.setdefault((board_id, user_id), MEMBER)
+    existing = {
+        (board_id, user_id): (pk, role)
+        for pk, board_id, user_id, role in BoardAccess.objects.filter(board_id__in=board_ids).values_list(
+            "id", "board_id", "user_id", "role"
+        )
+    }
+    stale = [pk for key, (pk, _) in existing.items() if key not in wanted]
+    changed = [
+        BoardAccess(pk=existing[key][0], role=role)
+        for key, role in wanted.items()
+        if key in existing and existing[key][1] != role
+    ]
+    created = [
+        BoardAccess(board_id=board_id, user_id=user_id, role=role)
+        for (board_id, user_id), role in wanted.items()
+        if (board_id, user_id) not in existing
+    ]
+    with transaction.atomic():
+        if stale:
+            BoardAccess.objects.filter(pk__in=stale).delete()
+        if changed:
+            BoardAccess.objects.bulk_update(changed, ["role"])
+        if created:
+            BoardAccess.objects.bulk_create(created, ignore_conflicts=True)
+    return len(changed) + len(created), len(stale)
+
+
+def _bump_generation(board_id):
+    cache.set(_generation_key(board_id), time.time_ns(), timeout=None)
+
+
+def invalidate_board_access(board_id):
+    # Renouvelée aussi après le commit : une lecture concurrente faite avant
+    # la fin de la transaction ne laisse pas un ancien rôle en cache
+    _bump_generation(board_id)
+    transaction.on_commit(lambda: _bump_generation(board_id))
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class BoardsConfig(AppConfig):
     name = "boards"
+
+    def ready(self):
+        # Synchronisation de la table BoardAccess
+        from . import signals  # noqa: F401
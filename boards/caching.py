@@ -0,0 +1,131 @@
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Board, List, Card, Label
+from .queries import attach_card_previews
+
+logger = logging.getLogger(__name__)
+
+
+LABELS_VERSION_KEY = "boards:labels:version"
+
+
+def bump_board_version(board_id, list_ids=(), card_ids=()):
+    """
+    Incrémente la version du tableau, celle des listes dont les cartes ont
+    changé et celle des cartes modifiées. Les colonnes des autres listes
+    restent servies depuis le cache.
+
+    La ligne du tableau, partagée par toutes les écritures du tableau, est
+    mise à jour en dernier : son verrou n'est tenu que jusqu'au commit.
+    """
+    list_ids = {list_id for list_id in list_ids if list_id}
+    if list_ids:
+        List.objects.filter(pk__in=list_ids, board_id=board_id).update(version=F("version") + 1)
+    card_ids = {card_id for card_id in card_ids if card_id}
+    if card_ids:
+        Card.objects.filter(pk__in=card_ids, list__board_id=board_id).update(version=F("version") + 1)
+    Board.objects.filter(pk=board_id).update(version=F("version") + 1)
+
+
+def labels_version():
+    """
+    Jeton du catalogue global des labels. Il n'est pas persistant : s'il est
+    évincé du cache, un nouveau jeton (horodatage) est simplement généré.
+    """
+    return cache.get_or_set(LABELS_VERSION_KEY, time.time_ns, timeout=None)
+
+
+def bump_labels_version():
+    cache.set(LABELS_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _catalog_key(board):
+    # Les labels sont globaux : leur jeton de version fait partie de la clé
+    return f"boards:catalog:{board.id}:{board.created_at.timestamp()}:l{labels_version()}"
+
+
+def board_catalog(board):
+    """
+    Catalogue du tableau pour le modal de carte : labels disponibles et
+    membres (propriétaire compris), prêts à sérialiser.
+
+    Servi depuis le cache ; reconstruit (deux requêtes) après une invitation,
+    un retrait de membre ou un changement du catalogue des labels.
+    """
+    key = _catalog_key(board)
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = {
+            "labels": [
+                {"id": label.id, "name": label.name, "color": label.color}
+                for label in Label.objects.order_by("name")
+            ],
+            "members": [
+                {"id": u.id, "username": u.username, "initial": u.username[0].upper()}
+                for u in User.objects.filter(board_accesses__board=board).order_by("username")
+            ],
+        }
+        cache.set(key, catalog, getattr(settings, "BOARD_CATALOG_CACHE_TIMEOUT", 3600))
+    return catalog
+
+
+def invalidate_board_catalog(board):
+    # Supprimé aussi après le commit, comme les rôles en cache : une lecture
+    # concurrente faite avant la fin de la transaction ne laisse pas l'ancien
+    # catalogue en cache
+    key = _catalog_key(board)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def _fragment_timeout():
+    return getattr(settings, "BOARD_FRAGMENT_CACHE_TIMEOUT", 300)
+
+
+def _fragment_key(board_list, sort, limit):
+    # created_at protège contre la réutilisation d'un id (SQLite) avec version 0
+    return (
+        f"boards:list-cards:{board_list.id}:{board_list.created_at.timestamp()}"
+        f":v{board_list.version}:{sort}:n{limit or 0}"
+    )
+
+
+def render_list_fragments(board_lists, sort, now, limit=None):
+    """
+    Attache `list.cards_html` (colonne de cartes rendue) à chaque liste.
+
+    Les colonnes dont la version n'a pas changé sont lues dans le cache ; seules
+    les listes manquantes sont chargées (une requête pour toutes) et rendues.
+    Avec `limit`, chaque colonne ne contient que ses premières cartes et un
+    marqueur de chargement pour la suite.
+    """
+    board_lists = list(board_lists)
+    timeout = _fragment_timeout()
+    keys = {board_list.id: _fragment_key(board_list, sort, limit) for board_list in board_lists}
+    cached = cache.get_many(keys.values()) if timeout else {}
+
+    missing = [board_list for board_list in board_lists if keys[board_list.id] not in cached]
+    attach_card_previews(missing, sort=sort, limit=limit)
+    rendered = {}
+    for board_list in missing:
+        rendered[keys[board_list.id]] = render_to_string(
+            "boards/partials/list_cards.html",
+            {"board_list": board_list, "cards": board_list.cached_cards, "now": now},
+        )
+    if rendered and timeout:
+        cache.set_many(rendered, timeout)
+    logger.debug(f"Colonnes en cache : {len(board_lists) - len(missing)}/{len(board_lists)}")
+
+    html = {**cached, **rendered}
+    for board_list in board_lists:
+        board_list.cards_html = mark_safe(html[keys[board_list.id]])
+    return board_lists
@@ -1,10 +1,20 @@
+import asyncio
+import json
+import time
+import weakref
+from collections import Counter
+from functools import lru_cache
+from urllib.parse import parse_qs
+
+import msgpack
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.db.models import Q
-from django.shortcuts import get_object_or_404
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 
-from .models import Board
+from .access import board_role
+from .events import board_events_since, encode_event
 
 
 import logging
@@ -12,8 +22,80 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+# Sous-protocole binaire optionnel ; sans lui (ou avec "epitrello.json"), JSON texte
+MSGPACK_SUBPROTOCOL = "epitrello.msgpack"
+JSON_SUBPROTOCOL = "epitrello.json"
+
+
+@lru_cache(maxsize=256)
+def msgpack_frame(text):
+    """
+    Trame MessagePack d'un événement déjà encodé en JSON. Le cache est partagé
+    par les consumers du processus : la conversion est faite une fois par
+    événement et non une fois par connexion.
+    """
+    return msgpack.packb(json.loads(text))
+
+
+# Files d'envoi des connexions du processus, pour la métrique de profondeur
+live_consumers = weakref.WeakSet()
+send_queue_overflows = Counter()
+
+
+def send_queue_metrics():
+    """Profondeur des files d'envoi des WebSockets ouverts dans ce processus."""
+    depths = [consumer.queue_depth for consumer in list(live_consumers)]
+    return {
+        "connections": len(depths),
+        "queued_events": sum(depths),
+        "max_queue_depth": max(depths, default=0),
+        "queue_limit": getattr(settings, "BOARD_WS_SEND_QUEUE_SIZE", 0),
+        "policy": getattr(settings, "BOARD_WS_SEND_QUEUE_POLICY", "coalesce"),
+        "overflows": dict(send_queue_overflows),
+    }
+
+
+def coalesce_events(events):
+    """
+    Fusionne les événements en attente d'une connexion.
+
+    Plusieurs `card.updated` pour une même carte n'en font qu'un : les champs
+    sont fusionnés (les plus récents l'emportent, la version de départ reste
+    celle du premier delta) et l'événement prend la place du dernier, après
+    les événements intercalés. Les autres sont conservés
+    dans l'ordre.
+    """
+    merged = []
+    for payload in events:
+        card = payload.get("card") if payload.get("action") == "card.updated" else None
+        if card:
+            for index, previous in enumerate(merged):
+                if previous.get("action") == "card.updated" and previous["card"].get("id") == card.get("id"):
+                    merged_card = {**previous["card"], **card}
+                    # Le delta fusionné s'applique à la version de départ du premier
+                    if "base_version" in previous["card"]:
+                        merged_card["base_version"] = previous["card"]["base_version"]
+                    payload = {**previous, **payload, "card": merged_card}
+                    del merged[index]
+                    break
+        merged.append(payload)
+    return merged
+
+
 class BoardConsumer(AsyncJsonWebsocketConsumer):
+    flush_task = None
+    heartbeat_task = None
+    last_seen = 0.0
+    binary = False
+    # Intervalle rejoué à la connexion (replayed_from, replayed_through] : ces
+    # numéros, s'ils arrivent aussi par le groupe, ont déjà été envoyés
+    replayed_from = 0
+    replayed_through = 0
+
     async def connect(self):
+        self.pending_events = []
+        subprotocols = self.scope.get("subprotocols") or []
+        self.binary = MSGPACK_SUBPROTOCOL in subprotocols
         self.board_id = self.scope.get("url_route", {}).get("kwargs", {}).get("board_id")
         self.group_name = f"board_{self.board_id}"
         logger.debug(f"Tentative de connexion WebSocket pour le tableau {self.board_id}")
@@ -24,37 +106,207 @@ class BoardConsumer(AsyncJsonWebsocketConsumer):
             await self.close(code=4401)  # unauthorized
             return
 
-        # Check access rights
-        has_access = await self._user_has_access(user.id, self.board_id)
+        # Check access rights (lecture en cache partagée avec les vues)
+        self.user_id = user.id
+        has_access = await self._user_has_access(user, self.board_id)
         if not has_access:
             logger.warning(f"Connexion WebSocket refusée : utilisateur {user.username} n'a pas accès au tableau {self.board_id}")
             await self.close(code=4403)  # forbidden
             return
 
         await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+        if self.binary:
+            await self.accept(subprotocol=MSGPACK_SUBPROTOCOL)
+        elif JSON_SUBPROTOCOL in subprotocols:
+            await self.accept(subprotocol=JSON_SUBPROTOCOL)
+        else:
+            await self.accept()
+        live_consumers.add(self)
         logger.info(f"WebSocket connecté : utilisateur {user.username} sur le tableau {self.board_id}")
 
+        resume_from = self._resume_from()
+        if resume_from is not None:
+            await self._replay(resume_from)
+
+        self.last_seen = time.monotonic()
+        interval = getattr(settings, "BOARD_WS_HEARTBEAT_INTERVAL", 0)
+        if interval:
+            self.heartbeat_task = asyncio.create_task(self._heartbeat(interval))
+
+    def _resume_from(self):
+        # ws/boards/<id>/?resume_from=<seq> : dernier événement reçu par le client
+        params = parse_qs((self.scope.get("query_string") or b"").decode())
+        try:
+            return max(0, int(params["resume_from"][0]))
+        except (KeyError, ValueError):
+            return None
+
+    async def _replay(self, resume_from):
+        # Le groupe a été rejoint avant la lecture du journal : aucun événement
+        # ne peut tomber entre le rejeu et la diffusion en direct
+        frames, through = await sync_to_async(board_events_since)(self.board_id, resume_from)
+        if frames is None:
+            logger.info(f"Rejeu impossible depuis {resume_from} pour le tableau {self.board_id} : rechargement demandé")
+            await self.send_frame(encode_event({"action": "resync", "seq": through}))
+            return
+        self.replayed_from, self.replayed_through = resume_from, through
+        await self.send_frames(frames)
+
+    async def _heartbeat(self, interval):
+        """
+        Ping périodique du serveur. Une connexion dont le client n'a rien envoyé
+        depuis BOARD_WS_IDLE_TIMEOUT (socket à moitié ouverte, onglet gelé) est
+        fermée et retirée du groupe : elle ne coûte plus rien à la diffusion.
+        """
+        timeout = getattr(settings, "BOARD_WS_IDLE_TIMEOUT", 0) or interval * 2
+        while True:
+            await asyncio.sleep(interval)
+            if time.monotonic() - self.last_seen > timeout:
+                logger.info(f"WebSocket inactif depuis {timeout}s sur le tableau {self.board_id} : fermeture")
+                self._cancel_tasks()
+                live_consumers.discard(self)
+                await self.channel_layer.group_discard(self.group_name, self.channel_name)
+                await self.close(code=4408)  # timeout
+                return
+            await self.send_json({"type": "ping"})
+            # Renouvelle l'appartenance au groupe (group_expiry du layer Redis)
+            await self.channel_layer.group_add(self.group_name, self.channel_name)
+
+    def _cancel_tasks(self):
+        current = asyncio.current_task()
+        for task in (self.flush_task, self.heartbeat_task):
+            if task and task is not current:
+                task.cancel()
+        self.flush_task = self.heartbeat_task = None
+
     async def disconnect(self, code):
+        self._cancel_tasks()
+        live_consumers.discard(self)
         if hasattr(self, "group_name"):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
             logger.info(f"WebSocket déconnecté (code: {code}) pour le tableau {self.board_id}")
 
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        # Tout message du client (dont le pong) prouve que la connexion est vivante
+        self.last_seen = time.monotonic()
+        if bytes_data is not None:
+            try:
+                content = msgpack.unpackb(bytes_data)
+            except Exception:
+                return
+            if isinstance(content, dict):
+                await self.receive_json(content, **kwargs)
+            return
+        await super().receive(text_data=text_data, bytes_data=bytes_data, **kwargs)
+
+    async def send_json(self, content, close=False):
+        if self.binary:
+            await self.send(bytes_data=msgpack.packb(content), close=close)
+        else:
+            await super().send_json(content, close=close)
+
+    async def send_frame(self, text):
+        """Envoie un événement pré-encodé en JSON, converti si la connexion est binaire."""
+        if self.binary:
+            await self.send(bytes_data=msgpack_frame(text))
+        else:
+            await self.send(text_data=text)
+
+    async def send_frames(self, frames):
+        """Envoie des événements pré-encodés, regroupés en une trame `batch` s'il y en a plusieurs."""
+        if len(frames) == 1:
+            await self.send_frame(frames[0])
+        elif frames:
+            await self.send_frame('{"action":"batch","events":[%s]}' % ",".join(frames))
+
     async def receive_json(self, content, **kwargs):
         # Optional: handle pings or client messages
         cmd = content.get("type")
         if cmd == "ping":
             await self.send_json({"type": "pong"})
 
+    @property
+    def queue_depth(self):
+        return len(getattr(self, "pending_events", ()))
+
     async def broadcast(self, event):
-        # Event shape: {"type": "broadcast", "payload": {...}}
+        # Event shape: {"type": "broadcast", "payload": {...}, "text": "<payload encodé>"}
         logger.debug(f"Diffusion d'un événement au WebSocket du tableau {self.board_id}")
-        await self.send_json(event.get("payload", {}))
+        payload = event.get("payload", {})
+        seq = payload.get("seq")
+        if seq and self.replayed_through:
+            if self.replayed_from < seq <= self.replayed_through:
+                return  # déjà envoyé par le rejeu
+            # Au-delà du rejeu, ou séquence repartie de zéro (compteur évincé,
+            # cache redémarré) : plus rien à dédoublonner
+            self.replayed_through = 0
+        # Trame pré-encodée par l'émetteur : pas de json.dumps par connexion.
+        # L'envoi est fait par une tâche dédiée : un client lent ne bloque pas
+        # la réception des messages du groupe, qui s'accumulent dans la file.
+        self.pending_events.append((payload, event.get("text") or encode_event(payload)))
+        limit = getattr(settings, "BOARD_WS_SEND_QUEUE_SIZE", 0)
+        if limit and len(self.pending_events) > limit:
+            await self._overflow(limit)
+        if self.flush_task is None and self.pending_events:
+            window = getattr(settings, "BOARD_WS_COALESCE_MS", 0) / 1000
+            self.flush_task = asyncio.create_task(self._flush_after(window))
+
+    async def _flush_after(self, window):
+        # Fenêtre de regroupement : une seule trame pour tous les événements reçus.
+        # Ceux arrivés pendant un envoi partent dans la trame suivante.
+        if window:
+            await asyncio.sleep(window)
+        while self.pending_events:
+            pending, self.pending_events = self._compact(self.pending_events), []
+            await self.send_frames([text for _, text in pending])
+        self.flush_task = None
+
+    @staticmethod
+    def _compact(pending):
+        # Les événements non fusionnés gardent leur trame pré-encodée
+        texts = {id(payload): text for payload, text in pending}
+        return [
+            (payload, texts.get(id(payload)) or encode_event(payload))
+            for payload in coalesce_events([payload for payload, _ in pending])
+        ]
+
+    async def _overflow(self, limit):
+        """
+        File d'envoi pleine (BOARD_WS_SEND_QUEUE_SIZE), selon BOARD_WS_SEND_QUEUE_POLICY :
+        - coalesce : fusion des événements remplacés ; si cela ne suffit pas, resync
+        - resync : la file est remplacée par un unique signal de rechargement
+        - disconnect : la connexion est fermée (4429), le client se reconnecte
+          et rejoue les événements manqués depuis le journal
+        """
+        policy = getattr(settings, "BOARD_WS_SEND_QUEUE_POLICY", "coalesce")
+        send_queue_overflows[policy] += 1
+        logger.warning(f"File d'envoi pleine ({len(self.pending_events)}) sur le tableau {self.board_id} : {policy}")
+        if policy == "coalesce":
+            self.pending_events = self._compact(self.pending_events)
+            if len(self.pending_events) <= limit:
+                return
+            policy = "resync"
+        if policy == "disconnect":
+            self._cancel_tasks()
+            self.pending_events = []
+            live_consumers.discard(self)
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await self.close(code=4429)  # trop d'événements en attente
+            return
+        seq = max((payload.get("seq") or 0 for payload, _ in self.pending_events), default=0)
+        resync = {"action": "resync", "seq": seq}
+        self.pending_events = [(resync, encode_event(resync))]
+
+    async def access_revoked(self, event):
+        # Event shape: {"type": "access.revoked", "user_id": <id> | None (tableau supprimé)}
+        user_id = event.get("user_id")
+        if user_id is not None and user_id != getattr(self, "user_id", None):
+            return
+        logger.info(f"Accès révoqué : fermeture du WebSocket du tableau {self.board_id}")
+        self._cancel_tasks()
+        live_consumers.discard(self)
+        await self.close(code=4403)  # forbidden
 
     @database_sync_to_async
-    def _user_has_access(self, user_id, board_id):
-        try:
-            get_object_or_404(Board, Q(owner_id=user_id) | Q(members__id=user_id), pk=board_id)
-            return True
-        except Exception:
-            return False
+    def _user_has_access(self, user, board_id):
+        return board_role(user, board_id) is not None
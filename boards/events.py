@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def board_group(board_id):
+    return f"board_{board_id}"
+
+
+def encode_event(payload):
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def broadcast_message(payload):
+    """
+    Message de groupe `broadcast`. La trame texte est encodée une seule fois
+    ici ; chaque consumer du groupe la transmet telle quelle au lieu de
+    ré-encoder `payload` (conservé pour la fusion des événements).
+    """
+    return {"type": "broadcast", "payload": payload, "text": encode_event(payload)}
+
+
+# Journal des événements d'un tableau : chaque événement diffusé reçoit un
+# numéro de séquence croissant (`seq`) et sa trame est conservée pour les
+# BOARD_EVENT_LOG_SIZE derniers. Un client qui se reconnecte rejoue ce qu'il a
+# manqué au lieu de recharger tout le tableau.
+
+
+def _seq_key(board_id):
+    return f"boards:events-seq:{board_id}"
+
+
+def _log_key(board_id, seq):
+    return f"boards:events:{board_id}:{seq}"
+
+
+def _log_size():
+    return getattr(settings, "BOARD_EVENT_LOG_SIZE", 500)
+
+
+def board_event_seq(board_id):
+    """Numéro du dernier événement diffusé sur le tableau (0 si aucun)."""
+    return cache.get(_seq_key(board_id), 0)
+
+
+def record_board_event(board_id, payload):
+    """
+    Numérote l'événement, l'ajoute au journal borné du tableau et renvoie le
+    message `broadcast` correspondant. L'incrément est atomique (Redis) : la
+    séquence est partagée par tous les processus.
+    """
+    key = _seq_key(board_id)
+    cache.add(key, 0, timeout=None)
+    seq = cache.incr(key)
+    message = broadcast_message({**payload, "seq": seq})
+    cache.set(_log_key(board_id, seq), message["text"], getattr(settings, "BOARD_EVENT_LOG_TIMEOUT", 3600))
+    # Le journal ne garde que les BOARD_EVENT_LOG_SIZE derniers événements
+    cache.delete(_log_key(board_id, seq - _log_size()))
+    return message
+
+
+def board_events_since(board_id, seq):
+    """
+    Trames des événements postérieurs à `seq`, dans l'ordre, et numéro du
+    dernier rejoué. Renvoie (None, séquence courante) quand le journal ne
+    couvre plus l'intervalle : le client doit recharger le tableau.
+
+    Un événement numéroté mais pas encore écrit termine le rejeu ; il arrivera
+    par le groupe, que le consumer a rejoint avant de lire le journal.
+    """
+    current = board_event_seq(board_id)
+    if seq > current or current - seq > _log_size():
+        return None, current
+    keys = [_log_key(board_id, n) for n in range(seq + 1, current + 1)]
+    found = cache.get_many(keys)
+    if keys and keys[0] not in found:
+        return None, current
+    frames = []
+    for key in keys:
+        if key not in found:
+            break
+        frames.append(found[key])
+    return frames, seq + len(frames)
+
+
+class BoardEventDispatcher:
+    """
+    Diffuse les événements de tableau aux groupes `board_<id>`.
+
+    Un événement n'est envoyé qu'après le commit de la transaction qui l'a
+    produit (ATOMIC_REQUESTS) : les clients ne reçoivent jamais une ligne qu'ils
+    ne peuvent pas encore lire, et rien n'est envoyé en cas de rollback.
+
+    En mode asynchrone (BOARD_EVENTS_ASYNC), les événements sont déposés dans
+    une file vidée par un thread d'arrière-plan, qui envoie tout ce qui est en
+    attente en un seul passage : la requête ne paie plus les allers-retours
+    Redis, ni pour l'envoi ni pour la numérotation et le journal (faits par ce
+    thread, dans l'ordre de la file, donc dans l'ordre des commits). Sinon l'envoi est fait directement dans le callback on_commit (tests,
+    InMemoryChannelLayer lié à la boucle du serveur).
+    """
+
+    max_batch = 100
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    # Éléments de la file : (board_id, payload à numéroter, None) pour un
+    # événement de tableau, (board_id, None, message) pour un message prêt
+
+    def dispatch(self, board_id, payload):
+        # Numéroté à l'envoi, dans l'ordre de la file : la séquence suit l'ordre des commits
+        item = (board_id, payload, None)
+        transaction.on_commit(lambda: self._submit(item))
+
+    def dispatch_message(self, board_id, message):
+        """Envoie un message de groupe quelconque (ex. `access.revoked`) après le commit."""
+        item = (board_id, None, message)
+        transaction.on_commit(lambda: self._submit(item))
+
+    def _record(self, board_id, payload):
+        try:
+            return record_board_event(board_id, payload)
+        except Exception as e:
+            # Cache indisponible : diffusé sans numéro, les clients ne pourront pas le rejouer
+            logger.error(f"Erreur lors de l'enregistrement d'un événement du tableau {board_id} : {e}")
+            return broadcast_message(payload)
+
+    def _submit(self, item):
+        if not getattr(settings, "BOARD_EVENTS_ASYNC", False):
+            self.send_batch([item])
+            return
+        self._ensure_worker()
+        self._queue.put(item)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="board-events", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        # Boucle propre au thread, conservée : les connexions Redis du layer
+        # sont rattachées à la boucle qui les a ouvertes
+        loop = asyncio.new_event_loop()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.send_batch(batch, loop=loop)
+
+    def send_batch(self, batch, loop=None):
+        batch = [
+            (board_group(board_id), message if message is not None else self._record(board_id, payload))
+            for board_id, payload, message in batch
+        ]
+        try:
+            layer = get_channel_layer()
+            if not layer:
+                logger.warning(f"Impossible de diffuser {len(batch)} événement(s) : CHANNEL_LAYER non configuré.")
+                return
+            if loop:
+                loop.run_until_complete(self._send_all(layer, batch))
+            else:
+                async_to_sync(self._send_all)(layer, batch)
+        except Exception as e:
+            logger.error(f"Erreur lors de la diffusion de {len(batch)} événement(s) : {e}")
+
+    async def _send_all(self, layer, batch):
+        results = await asyncio.gather(
+            *(layer.group_send(group, message) for group, message in batch),
+            return_exceptions=True,
+        )
+        for (group, message), result in zip(batch, results):
+            if isinstance(result, Exception):
+                logger.error(f"Erreur lors de la diffusion de l'événement au groupe {group} : {result}")
+            else:
+                logger.debug(f"Événement diffusé au groupe {group} : {message.get('payload', {}).get('action') or message['type']}")
+
+
+dispatcher = BoardEventDispatcher()
+
+
+def dispatch_board_event(board_id, payload):
+    dispatcher.dispatch(board_id, payload)
+
+
+def dispatch_access_revoked(board_id, user_id=None):
+    """
+    Ferme (code 4403) les sockets du tableau ouvertes par `user_id`, ou toutes
+    les sockets du tableau si `user_id` est None (tableau supprimé).
+    """
+    dispatcher.dispatch_message(board_id, {"type": "access.revoked", "user_id": user_id})
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from boards.access import invalidate_board_access, sync_board_access
+from boards.models import Board
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule la table BoardAccess depuis Board.owner et Board.members, par lots de tableaux "
+        "(rattrapage après un import SQL ou des modifications faites hors de l'ORM)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Nombre de tableaux par lot")
+        parser.add_argument("--board", type=int, action="append", dest="boards", help="Limiter à ce tableau (répétable)")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size doit être positif.")
+        board_ids = Board.objects.order_by("pk").values_list("pk", flat=True)
+        if options["boards"]:
+            board_ids = board_ids.filter(pk__in=options["boards"])
+        board_ids = list(board_ids)
+
+        written = deleted = 0
+        for start in range(0, len(board_ids), options["batch_size"]):
+            batch = board_ids[start:start + options["batch_size"]]
+            batch_written, batch_deleted = sync_board_access(batch)
+            written += batch_written
+            deleted += batch_deleted
+            if batch_written or batch_deleted:
+                for board_id in batch:
+                    invalidate_board_access(board_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(board_ids)} tableaux vérifiés : {written} accès créés ou corrigés, {deleted} supprimés."
+        ))
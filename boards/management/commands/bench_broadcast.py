@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from boards.consumers import BoardConsumer
+from boards.events import broadcast_message
+
+
+def sample_payload():
+    # Delta typique d'une carte (titre et description modifiés)
+    return {
+        "action": "card.updated",
+        "card": {
+            "id": 4242,
+            "list_id": 17,
+            "version": 12,
+            "base_version": 11,
+            "title": "Préparer la démo client",
+            "description": "Vérifier les maquettes, le jeu de données et la checklist de mise en production. " * 3,
+            "due_date": "2026-10-18T09:00:00+00:00",
+            "due_date_display": "18/10/2026 11:00",
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = "Mesure le coût d'encodage d'une diffusion selon la taille du groupe (encodage par connexion vs une fois)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1,10,100,300,1000", help="Tailles de groupe, séparées par des virgules")
+        parser.add_argument("--repeat", type=int, default=20, help="Diffusions mesurées par taille")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",") if size.strip()]
+        # Les logs de debug par événement fausseraient la mesure
+        logging.disable(logging.INFO)
+        self.stdout.write(f"{'connexions':>10} {'par connexion (ms)':>20} {'une fois (ms)':>15} {'gain':>8}")
+        # Sans fenêtre de regroupement : on mesure le chemin broadcast -> send seul
+        with override_settings(BOARD_WS_COALESCE_MS=0):
+            for size in sizes:
+                per_connection, once = asyncio.run(self._measure(size, options["repeat"]))
+                self.stdout.write(
+                    f"{size:>10} {per_connection * 1000:>20.3f} {once * 1000:>15.3f} {per_connection / once:>7.1f}x"
+                )
+
+    async def _measure(self, size, repeat):
+        consumers = []
+        for _ in range(size):
+            consumer = BoardConsumer()
+            consumer.board_id = 0
+            consumer.pending_events = []
+            consumer.base_send = self._discard
+            consumers.append(consumer)
+
+        async def fan_out(make_event):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                # Comme le channel layer : chaque consumer reçoit sa copie du message
+                event = make_event()
+                for consumer in consumers:
+                    await consumer.broadcast(event)
+                # Envoi fait par la tâche de chaque connexion
+                await asyncio.gather(*(c.flush_task for c in consumers if c.flush_task))
+            return (time.perf_counter() - start) / repeat
+
+        per_connection = await fan_out(lambda: {"type": "broadcast", "payload": sample_payload()})
+        once = await fan_out(lambda: broadcast_message(sample_payload()))
+        return per_connection, once
+
+    @staticmethod
+    async def _discard(message):
+        pass
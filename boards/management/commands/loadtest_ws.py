@@ -0,0 +1,200 @@
+import asyncio
+import gc
+import json
+import logging
+import time
+import tracemalloc
+import uuid
+
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from boards.models import Board, List
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge du temps réel : ouvre N WebSockets répartis sur M tableaux via l'application "
+        "ASGI du projet, crée des cartes par les vues et mesure la latence de livraison, la mémoire "
+        "par connexion et le CPU par événement. Attention : un utilisateur, M tableaux et les cartes "
+        "sont créés dans la base configurée (DATABASES), puis supprimés à la fin"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sockets", type=int, default=200, help="Nombre de WebSockets ouverts")
+        parser.add_argument("--boards", type=int, default=10, help="Nombre de tableaux (groupes)")
+        parser.add_argument("--events", type=int, default=100, help="Nombre de cartes créées")
+        parser.add_argument("--layer", choices=["memory", "redis"], default="memory", help="Channel layer utilisé")
+        parser.add_argument("--redis-url", default="redis://127.0.0.1:6379/0", help="Redis/Valkey local (--layer redis)")
+        parser.add_argument("--coalesce-ms", type=int, default=0, help="Fenêtre de regroupement (BOARD_WS_COALESCE_MS)")
+        parser.add_argument("--timeout", type=float, default=30, help="Attente maximale des livraisons (s)")
+
+    def handle(self, *args, **options):
+        if options["sockets"] < 1 or options["boards"] < 1 or options["events"] < 1:
+            raise CommandError("--sockets, --boards et --events doivent être positifs.")
+        overrides = {
+            "ALLOWED_HOSTS": [*settings.ALLOWED_HOSTS, "testserver"],
+            "BOARD_WS_COALESCE_MS": options["coalesce_ms"],
+            # Pas de ping serveur pendant la mesure
+            "BOARD_WS_HEARTBEAT_INTERVAL": 0,
+        }
+        if options["layer"] == "redis":
+            self._check_redis(options["redis_url"])
+            overrides["CHANNEL_LAYERS"] = {
+                "default": {
+                    "BACKEND": "channels_redis.core.RedisChannelLayer",
+                    "CONFIG": {"hosts": [options["redis_url"]], "capacity": 10000},
+                }
+            }
+            overrides["BOARD_EVENTS_ASYNC"] = True
+        else:
+            overrides["CHANNEL_LAYERS"] = {
+                "default": {"BACKEND": "channels.layers.InMemoryChannelLayer", "CONFIG": {"capacity": 10000}}
+            }
+            # L'InMemoryChannelLayer est lié à la boucle : envoi dans le callback on_commit
+            overrides["BOARD_EVENTS_ASYNC"] = False
+
+        # Les logs par connexion et par événement fausseraient la mesure
+        logging.disable(logging.INFO)
+        user, board_ids, list_ids = self._create_fixtures(options["boards"])
+        try:
+            client = Client()
+            client.force_login(user)
+            with override_settings(**overrides):
+                report = asyncio.run(self._run(client, board_ids, list_ids, options))
+        finally:
+            Board.objects.filter(pk__in=board_ids).delete()
+            user.delete()
+        self._print_report(options, report)
+
+    def _check_redis(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise CommandError("--layer redis nécessite channels_redis (pip install channels_redis).")
+        try:
+            redis.Redis.from_url(url).ping()
+        except redis.RedisError as e:
+            raise CommandError(f"Redis/Valkey injoignable sur {url} : {e}")
+
+    def _create_fixtures(self, board_count):
+        user = User.objects.create_user(username=f"loadtest-{uuid.uuid4().hex[:8]}")
+        board_ids, list_ids = [], {}
+        for n in range(board_count):
+            board = Board.objects.create(title=f"Load test {n}", owner=user)
+            list_ids[board.id] = List.objects.create(title="Cartes", board=board, position=1).id
+            board_ids.append(board.id)
+        return user, board_ids, list_ids
+
+    async def _run(self, client, board_ids, list_ids, options):
+        from epitrello.asgi import application
+
+        cookie = f"sessionid={client.cookies['sessionid'].value}".encode()
+        arrivals = {}
+
+        # Connexions : mémoire Python allouée par WebSocket (consumer, files et
+        # client de test compris, les deux extrémités étant dans le processus)
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        sockets = []
+        for n in range(options["sockets"]):
+            board_id = board_ids[n % len(board_ids)]
+            communicator = WebsocketCommunicator(application, f"/ws/boards/{board_id}/", headers=[(b"cookie", cookie)])
+            connected, _ = await communicator.connect(timeout=10)
+            if not connected:
+                raise CommandError(f"Connexion WebSocket refusée pour le tableau {board_id}.")
+            sockets.append((board_id, communicator))
+        gc.collect()
+        memory_per_socket = (tracemalloc.get_traced_memory()[0] - before) / len(sockets)
+        tracemalloc.stop()
+
+        receivers = [asyncio.create_task(self._receive(communicator, arrivals)) for _, communicator in sockets]
+        subscribers = {board_id: sum(1 for b, _ in sockets if b == board_id) for board_id in board_ids}
+
+        # Mutations par la vue create_card : la latence court de l'envoi de la
+        # requête (commit et diffusion compris) à la réception par chaque socket
+        post = sync_to_async(client.post)
+        sent, request_times = {}, []
+        expected = 0
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        for n in range(options["events"]):
+            board_id = board_ids[n % len(board_ids)]
+            title = f"lt-{n}"
+            url = reverse("boards:create_card", kwargs={"board_id": board_id})
+            started = time.perf_counter()
+            sent[title] = started
+            await post(url, {"list_id": list_ids[board_id], "title": title})
+            request_times.append(time.perf_counter() - started)
+            expected += subscribers[board_id]
+
+        deadline = time.perf_counter() + options["timeout"]
+        while sum(len(times) for times in arrivals.values()) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+
+        for task in receivers:
+            task.cancel()
+        await asyncio.gather(*receivers, return_exceptions=True)
+        for _, communicator in sockets:
+            await communicator.disconnect()
+
+        latencies = [
+            arrival - sent[title]
+            for title, times in arrivals.items() if title in sent
+            for arrival in times
+        ]
+        return {
+            "delivered": len(latencies),
+            "expected": expected,
+            "latencies": latencies,
+            "request_times": request_times,
+            "memory_per_socket": memory_per_socket,
+            "cpu": cpu,
+            "wall": wall,
+        }
+
+    async def _receive(self, communicator, arrivals):
+        while True:
+            # Délai long : un dépassement arrêterait l'application ASGI du socket
+            frame = json.loads(await communicator.receive_from(timeout=3600))
+            received = time.perf_counter()
+            for event in frame["events"] if frame.get("action") == "batch" else [frame]:
+                if event.get("action") == "card.created":
+                    arrivals.setdefault(event["card"]["title"], []).append(received)
+
+    def _print_report(self, options, report):
+        latencies = report["latencies"]
+        self.stdout.write(
+            f"Layer {options['layer']} : {options['sockets']} sockets, {options['boards']} tableaux, "
+            f"{options['events']} événements (regroupement {options['coalesce_ms']} ms)"
+        )
+        self.stdout.write(f"  livraisons          {report['delivered']}/{report['expected']}")
+        self.stdout.write(
+            f"  latence (ms)        p50 {percentile(latencies, 50) * 1000:.2f}"
+            f"  p99 {percentile(latencies, 99) * 1000:.2f}  max {max(latencies, default=0) * 1000:.2f}"
+        )
+        self.stdout.write(f"  requête (ms)        p50 {percentile(report['request_times'], 50) * 1000:.2f}")
+        self.stdout.write(f"  mémoire / socket    {report['memory_per_socket'] / 1024:.1f} Kio")
+        self.stdout.write(
+            f"  CPU / événement     {report['cpu'] / options['events'] * 1000:.2f} ms"
+            f"  ({report['cpu'] / max(report['delivered'], 1) * 1e6:.0f} µs par livraison)"
+        )
+        self.stdout.write(f"  débit               {report['delivered'] / report['wall']:.0f} livraisons/s")
+        if report["delivered"] < report["expected"]:
+            self.stderr.write(self.style.WARNING("Livraisons manquantes : délai dépassé ou messages perdus par le layer."))
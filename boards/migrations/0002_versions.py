@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("boards", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="board",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="list",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
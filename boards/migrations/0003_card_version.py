@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("boards", "0002_versions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="card",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:00
+
+from django.db import migrations
+
+# Écart entre deux positions (boards.ordering.POSITION_STEP au moment de la migration)
+POSITION_STEP = 1024
+
+
+def space_positions(apps, schema_editor):
+    """Renumérote listes et cartes de POSITION_STEP en POSITION_STEP, dans l'ordre actuel."""
+    for model_name, parent in (("List", "board_id"), ("Card", "list_id")):
+        model = apps.get_model("boards", model_name)
+        changed, parent_id, rank = [], None, 0
+        for item in model.objects.order_by(parent, "position", "id").only("id", parent, "position").iterator():
+            if getattr(item, parent) != parent_id:
+                parent_id, rank = getattr(item, parent), 0
+            rank += 1
+            if item.position != rank * POSITION_STEP:
+                item.position = rank * POSITION_STEP
+                changed.append(item)
+        model.objects.bulk_update(changed, ["position"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("boards", "0003_card_version"),
+    ]
+
+    operations = [
+        # L'ordre est conservé : le retour arrière n'a rien à défaire
+        migrations.RunPython(space_positions, migrations.RunPython.noop),
+    ]
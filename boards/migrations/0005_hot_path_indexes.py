@@ -0,0 +1,47 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("boards", "0004_spaced_positions"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="list",
+            index=models.Index(fields=["board", "position"], name="list_board_position_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="card",
+            index=models.Index(fields=["list", "position"], name="card_list_position_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="card",
+            index=models.Index(
+                condition=models.Q(due_date__isnull=False), fields=["due_date"], name="card_due_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="subtask",
+            index=models.Index(fields=["card", "checklist", "position"], name="subtask_card_checklist_pos_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["card", "-created_at"], name="comment_card_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(fields=["user", "-created_at"], name="notif_user_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(is_read=False), fields=["user", "-created_at"], name="notif_user_unread_idx"
+            ),
+        ),
+    ]
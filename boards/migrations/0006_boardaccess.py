@@ -0,0 +1,64 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_board_access(apps, schema_editor):
+    """Une ligne par propriétaire puis par membre (le propriétaire l'emporte)."""
+    Board = apps.get_model("boards", "Board")
+    BoardAccess = apps.get_model("boards", "BoardAccess")
+    BoardAccess.objects.bulk_create(
+        (
+            BoardAccess(board_id=board_id, user_id=owner_id, role="owner")
+            for board_id, owner_id in Board.objects.values_list("id", "owner_id").iterator()
+        ),
+        batch_size=1000,
+    )
+    BoardAccess.objects.bulk_create(
+        (
+            BoardAccess(board_id=board_id, user_id=user_id, role="member")
+            for board_id, user_id in Board.members.through.objects.values_list("board_id", "user_id").iterator()
+        ),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("boards", "0005_hot_path_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BoardAccess",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("role", models.CharField(choices=[("owner", "Propriétaire"), ("member", "Membre")], max_length=6)),
+                (
+                    "board",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="accesses", to="boards.board"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="board_accesses",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(fields=("user", "board"), name="boardaccess_user_board_uniq")
+                ],
+            },
+        ),
+        migrations.RunPython(fill_board_access, migrations.RunPython.noop),
+    ]
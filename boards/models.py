@@ -7,11 +7,39 @@ class Board(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="owned_boards")
     members = models.ManyToManyField(User, related_name="joined_boards", blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Incrémenté à chaque modification visible du tableau (voir boards.caching)
+    version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.title
 
 
+class BoardAccess(models.Model):
+    """
+    Accès dénormalisé (tableau, utilisateur, rôle) : une ligne par propriétaire
+    et par membre, tenue à jour depuis Board.owner et Board.members (voir
+    boards.signals). Les contrôles d'accès filtrent par une seule jointure
+    indexée au lieu de `Q(owner=...) | Q(members=...)` avec DISTINCT.
+    """
+
+    OWNER = "owner"
+    MEMBER = "member"
+    ROLE_CHOICES = [(OWNER, "Propriétaire"), (MEMBER, "Membre")]
+
+    board = models.ForeignKey(Board, on_delete=models.CASCADE, related_name="accesses")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="board_accesses")
+    role = models.CharField(max_length=6, choices=ROLE_CHOICES)
+
+    class Meta:
+        constraints = [
+            # (user, board) : sert aussi d'index aux filtres par utilisateur
+            models.UniqueConstraint(fields=["user", "board"], name="boardaccess_user_board_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.board} ({self.role})"
+
+
 class List(models.Model):
     title = models.CharField(max_length=100)
     board = models.ForeignKey(
@@ -19,9 +47,12 @@ class List(models.Model):
     )
     position = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Incrémenté quand les cartes de la liste changent (clé du cache de colonne)
+    version = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ["position"]
+        indexes = [models.Index(fields=["board", "position"], name="list_board_position_idx")]
 
     def __str__(self):
         return f"{self.board.title} - {self.title}"
@@ -49,9 +80,16 @@ class Card(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     labels = models.ManyToManyField(Label, blank=True, related_name="cards")
+    # Incrémenté à chaque modification de la carte (ETag du détail)
+    version = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ["position"]
+        indexes = [
+            models.Index(fields=["list", "position"], name="card_list_position_idx"),
+            # Partiel : seules les cartes datées sont filtrées ou triées par échéance
+            models.Index(fields=["due_date"], name="card_due_date_idx", condition=models.Q(due_date__isnull=False)),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.list.title})"
@@ -86,6 +124,7 @@ class Subtask(models.Model):
 
     class Meta:
         ordering = ["position", "created_at"]
+        indexes = [models.Index(fields=["card", "checklist", "position"], name="subtask_card_checklist_pos_idx")]
 
     def __str__(self):
         return f"{self.title} (Card: {self.card.title})"
@@ -101,6 +140,7 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["card", "-created_at"], name="comment_card_created_idx")]
 
     def __str__(self):
         return f"Comment by {self.author} on {self.card.title}"
@@ -115,6 +155,11 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="notif_user_created_idx"),
+            # Partiel : le badge et « tout marquer comme lu » ne lisent que les non lues
+            models.Index(fields=["user", "-created_at"], name="notif_user_unread_idx", condition=models.Q(is_read=False)),
+        ]
 
     def __str__(self):
         return f"Notification for {self.user.username}: {self.message}"
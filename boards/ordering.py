@@ -0,0 +1,218 @@
+import bisect
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import IntegerField, Subquery, Value
+
+from .caching import bump_board_version
+from .models import Card, List
+
+logger = logging.getLogger(__name__)
+
+
+# Positions espacées des listes et des cartes : des entiers séparés de
+# POSITION_STEP. Insérer ou déplacer un élément prend une position libre entre
+# ses voisins et n'écrit que sa ligne ; `ordering = ["position"]` reste valable.
+# Quand un intervalle est épuisé, les frères sont renumérotés (une instruction),
+# de préférence en arrière-plan avant que la place ne manque.
+POSITION_STEP = 1024
+# Intervalle en dessous duquel les frères sont renumérotés en arrière-plan
+DENSE_GAP = 16
+
+
+def append_position(siblings):
+    """Position après le dernier élément de `siblings` (lecture de la plus grande position, indexée)."""
+    last = siblings.order_by("-position").values_list("position", flat=True).first()
+    return POSITION_STEP if last is None else last + POSITION_STEP
+
+
+def position_between(before, after):
+    """
+    Position strictement entre deux voisins (None pour une extrémité), ou None
+    s'il n'y a plus de place : les frères doivent être renumérotés.
+    """
+    if before is None and after is None:
+        return POSITION_STEP
+    if before is None:
+        return after - POSITION_STEP
+    if after is None:
+        return before + POSITION_STEP
+    if after - before < 2:
+        return None
+    return (before + after) // 2
+
+
+def move_annotations(siblings, moved_id, after_id=None, before_id=None):
+    """
+    Bornes de la nouvelle place de `moved_id` parmi `siblings` (ses futurs
+    frères), à annoter sur la requête qui charge l'élément déplacé : la
+    validation et la lecture des voisins tiennent en une requête.
+
+    - `anchor_position` : position du voisin demandé (`after_id` ou
+      `before_id`), None s'il n'est pas parmi les frères ;
+    - `other_position` : position du voisin de l'autre côté (dernier frère
+      sans voisin demandé), None en bout de liste.
+    """
+    others = siblings.exclude(pk=moved_id)
+    if after_id or before_id:
+        anchor = Subquery(others.filter(pk=after_id or before_id).values("position")[:1])
+        if after_id:
+            other = others.filter(position__gt=anchor).order_by("position")
+        else:
+            other = others.filter(position__lt=anchor).order_by("-position")
+    else:
+        anchor = Value(None, output_field=IntegerField())
+        other = others.order_by("-position")
+    return {"anchor_position": anchor, "other_position": Subquery(other.values("position")[:1])}
+
+
+def move_position(anchor, other, after_id=None, before_id=None):
+    """
+    Position correspondant aux bornes de `move_annotations`, ou None s'il n'y a
+    plus de place. Le second élément indique un intervalle devenu trop serré.
+    """
+    if before_id:
+        before, after = other, anchor
+    elif after_id:
+        before, after = anchor, other
+    else:
+        before, after = other, None
+    position = position_between(before, after)
+    dense = position is not None and before is not None and after is not None and after - before < 2 * DENSE_GAP
+    return position, dense
+
+
+def _ordered_subsequence(ids, current):
+    # Plus longue sous-suite de `ids` dont les positions actuelles sont déjà
+    # croissantes : ces éléments n'ont pas besoin de bouger
+    tails, tail_ids, parent = [], [], {}
+    for item_id in ids:
+        position = current.get(item_id)
+        if position is None:
+            continue
+        index = bisect.bisect_left(tails, position)
+        parent[item_id] = tail_ids[index - 1] if index else None
+        if index == len(tails):
+            tails.append(position)
+            tail_ids.append(item_id)
+        else:
+            tails[index] = position
+            tail_ids[index] = item_id
+    kept = set()
+    item_id = tail_ids[-1] if tail_ids else None
+    while item_id is not None:
+        kept.add(item_id)
+        item_id = parent[item_id]
+    return kept
+
+
+def plan_positions(ids, current):
+    """
+    Positions à écrire pour que les éléments `ids` soient dans cet ordre.
+
+    `current` donne la position actuelle des éléments déjà présents dans le
+    conteneur (liste ou tableau). Les éléments déjà bien ordonnés gardent leur
+    position, les autres sont répartis dans les intervalles libres : déplacer
+    un élément n'en écrit qu'un. Sans place, tout est renuméroté.
+
+    Renvoie `(changes, dense)` : {id: position} des seuls éléments qui changent,
+    et True si un intervalle utilisé est devenu trop serré (moins de DENSE_GAP).
+    """
+    kept = _ordered_subsequence(ids, current)
+    changes, dense = {}, False
+    index = 0
+    previous = None
+    while index < len(ids):
+        if ids[index] in kept:
+            previous = current[ids[index]]
+            index += 1
+            continue
+        # Suite d'éléments à placer entre `previous` et le prochain élément conservé
+        end = index
+        while end < len(ids) and ids[end] not in kept:
+            end += 1
+        following = current[ids[end]] if end < len(ids) else None
+        count = end - index
+        if previous is None and following is None:
+            slots = [POSITION_STEP * (n + 1) for n in range(count)]
+        elif previous is None:
+            slots = [following - POSITION_STEP * (count - n) for n in range(count)]
+        elif following is None:
+            slots = [previous + POSITION_STEP * (n + 1) for n in range(count)]
+        else:
+            gap = (following - previous) // (count + 1)
+            if gap < 1:
+                return _renumber(ids, current), False
+            slots = [previous + gap * (n + 1) for n in range(count)]
+            dense = dense or gap < DENSE_GAP
+        for item_id, position in zip(ids[index:end], slots):
+            if current.get(item_id) != position:
+                changes[item_id] = position
+        previous = slots[-1]
+        index = end
+    return changes, dense
+
+
+def _renumber(ids, current):
+    return {
+        item_id: POSITION_STEP * (n + 1)
+        for n, item_id in enumerate(ids)
+        if current.get(item_id) != POSITION_STEP * (n + 1)
+    }
+
+
+def rebalance(siblings):
+    """
+    Renumérote `siblings` (cartes ou listes) de POSITION_STEP en POSITION_STEP,
+    en une instruction, et incrémente dans la même transaction les versions
+    qui servent de clé aux colonnes en cache et aux ETags.
+    """
+    parent = "list_id" if siblings.model is Card else "board_id"
+    with transaction.atomic():
+        items = list(siblings.select_for_update().order_by("position", "id").only("id", "position", parent))
+        changed = []
+        for n, item in enumerate(items, start=1):
+            if item.position != POSITION_STEP * n:
+                item.position = POSITION_STEP * n
+                changed.append(item)
+        if changed:
+            siblings.model.objects.bulk_update(changed, ["position"])
+            _bump_rebalanced(siblings.model, {getattr(item, parent) for item in changed})
+    return len(changed)
+
+
+def _bump_rebalanced(model, parent_ids):
+    if model is Card:
+        boards = {}
+        for board_id, list_id in List.objects.filter(pk__in=parent_ids).values_list("board_id", "id"):
+            boards.setdefault(board_id, []).append(list_id)
+        for board_id, list_ids in boards.items():
+            bump_board_version(board_id, list_ids=list_ids)
+    else:
+        # L'ordre des colonnes ne change pas leur contenu : seule la version du tableau bouge
+        for board_id in parent_ids:
+            bump_board_version(board_id)
+
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="positions")
+
+
+def schedule_rebalance(model, **filters):
+    """
+    Renumérote `model.objects.filter(**filters)` après le commit, dans un thread
+    d'arrière-plan (BOARD_POSITIONS_ASYNC_REBALANCE), sinon dans le callback.
+    """
+    background = getattr(settings, "BOARD_POSITIONS_ASYNC_REBALANCE", False)
+
+    def run():
+        try:
+            rebalance(model.objects.filter(**filters))
+        except Exception as e:
+            logger.error(f"Erreur lors de la renumérotation des positions ({model.__name__} {filters}) : {e}")
+        finally:
+            if background:
+                connection.close()
+
+    transaction.on_commit((lambda: _executor.submit(run)) if background else run)
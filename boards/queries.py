@@ -0,0 +1,244 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Exists, F, Min, OuterRef, Prefetch, Q, Subquery, Window, prefetch_related_objects
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Board, List, Card, Subtask, Comment
+
+
+CARD_SORTS = {
+    "title": "title",
+    "due_date": "due_date",
+    "created_at": "-created_at",
+    "position": "position",
+}
+
+
+def count_subquery(queryset, outer_field):
+    """
+    COUNT(*) corrélé sur `outer_field` (ex. "card"), calculé côté SQL.
+
+    Une sous-requête par compteur évite le produit cartésien qu'on obtiendrait
+    en joignant sous-tâches et commentaires sur la même carte.
+    """
+    counts = (
+        queryset.filter(**{outer_field: OuterRef("pk")})
+        .order_by()
+        .values(outer_field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def accessible_boards(user):
+    # Une ligne BoardAccess par (tableau, utilisateur) : pas de doublons, pas de DISTINCT
+    return Board.objects.filter(accesses__user=user)
+
+
+def card_preview_queryset(sort="position"):
+    """
+    Cartes prêtes pour l'aperçu d'une colonne : compteurs annotés en SQL,
+    labels et assignés préchargés. Aucune ligne de sous-tâche ou de
+    commentaire n'est chargée en mémoire.
+    """
+    cards = Card.objects.annotate(
+        total_subtasks=count_subquery(Subtask.objects.all(), "card"),
+        completed_subtasks=count_subquery(Subtask.objects.filter(is_completed=True), "card"),
+        comment_count=count_subquery(Comment.objects.all(), "card"),
+    ).prefetch_related("labels", "assigned_to")
+    if sort == "label":
+        return cards.annotate(first_label=Min("labels__name")).order_by("first_label", "position")
+    # L'id départage les positions égales : c'est aussi l'ordre de la pagination
+    return cards.order_by(CARD_SORTS.get(sort, "position"), "id")
+
+
+def encode_cursor(card):
+    return f"{card.position}:{card.id}"
+
+
+def parse_cursor(value):
+    """Curseur `position:id` de la dernière carte vue, ou None s'il est invalide."""
+    position, _, card_id = (value or "").partition(":")
+    try:
+        return int(position), int(card_id)
+    except ValueError:
+        return None
+
+
+def page_cards(cards, after=None, limit=50):
+    """
+    Page de cartes en pagination par clé sur `(position, id)` : la requête
+    reste un parcours d'index borné quelle que soit la profondeur de la page.
+
+    Retourne `(cartes, curseur_suivant)` ; le curseur vaut None en fin de liste.
+    """
+    cards = cards.order_by("position", "id")
+    if after:
+        position, card_id = after
+        cards = cards.filter(Q(position__gt=position) | Q(position=position, id__gt=card_id))
+    page = list(cards[:limit + 1])
+    if len(page) > limit:
+        page = page[:limit]
+        return page, encode_cursor(page[-1])
+    return page, None
+
+
+# Tri de la liste des tableaux ; "activity" reprend la date de création
+BOARD_SORTS = {
+    "recent": "-created_at",
+    "alphabetic": "title",
+    "activity": "-created_at",
+}
+
+
+def annotate_board_counts(boards):
+    """
+    `list_count` et `card_count` de chaque tableau en sous-requêtes corrélées :
+    aucune liste ni carte n'est chargée, quel que soit le volume des tableaux.
+    """
+    return boards.annotate(
+        list_count=count_subquery(List.objects.all(), "board"),
+        card_count=count_subquery(Card.objects.all(), "list__board"),
+    )
+
+
+def parse_board_cursor(value, sort="recent"):
+    """Curseur `id:clé de tri` du dernier tableau vu, ou None s'il est invalide."""
+    board_id, _, key = (value or "").partition(":")
+    if not board_id.isdigit():
+        return None
+    if BOARD_SORTS.get(sort, "-created_at") == "title":
+        return key, int(board_id)
+    try:
+        created_at = parse_datetime(key)
+    except ValueError:
+        return None
+    return (created_at, int(board_id)) if created_at else None
+
+
+def page_boards(boards, sort="recent", after=None, limit=24):
+    """
+    Page de tableaux en pagination par clé sur `(clé de tri, id)`, comme
+    `page_cards` : le coût d'une page ne dépend pas du nombre de tableaux.
+
+    Retourne `(tableaux, curseur_suivant)` ; le curseur vaut None en fin de liste.
+    """
+    field = BOARD_SORTS.get(sort, "-created_at")
+    name = field.lstrip("-")
+    lookup = "lt" if field.startswith("-") else "gt"
+    boards = boards.order_by(field, "-id" if lookup == "lt" else "id")
+    if after:
+        key, board_id = after
+        boards = boards.filter(Q(**{f"{name}__{lookup}": key}) | Q(**{name: key, f"id__{lookup}": board_id}))
+    page = list(boards[:limit + 1])
+    if len(page) > limit:
+        page = page[:limit]
+        key = getattr(page[-1], name)
+        return page, f"{page[-1].id}:{key.isoformat() if name == 'created_at' else key}"
+    return page, None
+
+
+def _int_list(values):
+    ids = []
+    for value in values:
+        for part in str(value).split(","):
+            if part.strip().isdigit():
+                ids.append(int(part))
+    return ids
+
+
+def parse_card_filters(params):
+    """
+    Lit les filtres de cartes depuis un QueryDict (`request.GET`).
+
+    `label` et `assignee` acceptent plusieurs valeurs (répétées ou séparées
+    par des virgules), `due_from` / `due_to` des dates AAAA-MM-JJ incluses.
+    Les valeurs invalides sont ignorées.
+    """
+    return {
+        "query": (params.get("q") or "").strip(),
+        "labels": _int_list(params.getlist("label")),
+        "assignees": _int_list(params.getlist("assignee")),
+        "due_from": parse_date(params.get("due_from") or ""),
+        "due_to": parse_date(params.get("due_to") or ""),
+    }
+
+
+def filter_cards(cards, filters):
+    if not filters:
+        return cards
+    if filters.get("query"):
+        cards = cards.filter(title__icontains=filters["query"])
+    if filters.get("labels"):
+        # EXISTS plutôt qu'une jointure : pas de doublons, pas de DISTINCT
+        cards = cards.filter(Exists(Card.labels.through.objects.filter(
+            card_id=OuterRef("pk"), label_id__in=filters["labels"],
+        )))
+    if filters.get("assignees"):
+        cards = cards.filter(Exists(Card.assigned_to.through.objects.filter(
+            card_id=OuterRef("pk"), user_id__in=filters["assignees"],
+        )))
+    # Bornes en datetime plutôt que `due_date__date` : la comparaison porte sur
+    # la colonne elle-même et peut utiliser l'index card_due_date_idx
+    if filters.get("due_from"):
+        cards = cards.filter(due_date__gte=_day_start(filters["due_from"]))
+    if filters.get("due_to"):
+        cards = cards.filter(due_date__lt=_day_start(filters["due_to"] + timedelta(days=1)))
+    return cards
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def load_board(board):
+    """Précharge les listes ordonnées du tableau résolu par `access.resolve_board` (1 requête)."""
+    prefetch_related_objects([board], Prefetch("lists", queryset=List.objects.order_by("position")))
+    return board
+
+
+def attach_card_previews(board_lists, sort="position", filters=None, limit=None):
+    """
+    Renseigne `list.cached_cards` pour chaque liste donnée, en une requête de
+    cartes (plus labels et assignés) quel que soit le nombre de listes.
+
+    Avec `limit`, seules les `limit` premières cartes de chaque liste sont
+    chargées (ROW_NUMBER() par liste) et `list.next_cursor` permet de
+    demander la suite à `page_cards`. Réservé au tri par position.
+    """
+    board_lists = list(board_lists)
+    if not board_lists:
+        return board_lists
+    cards = filter_cards(card_preview_queryset(sort), filters).filter(list__in=board_lists)
+    if limit:
+        # Une carte de plus que la page pour savoir s'il reste une suite
+        cards = cards.annotate(
+            list_rank=Window(RowNumber(), partition_by=F("list_id"), order_by=(F("position"), F("id")))
+        ).filter(list_rank__lte=limit + 1)
+    by_list = {board_list.id: [] for board_list in board_lists}
+    for card in cards:
+        by_list[card.list_id].append(card)
+    for board_list in board_lists:
+        board_list.cached_cards = by_list[board_list.id]
+        board_list.next_cursor = None
+        if limit and len(board_list.cached_cards) > limit:
+            board_list.cached_cards = board_list.cached_cards[:limit]
+            board_list.next_cursor = encode_cursor(board_list.cached_cards[-1])
+    return board_lists
+
+
+def build_board_snapshot(board, sort="position", filters=None):
+    """
+    Charge les listes ordonnées du tableau (déjà résolu, contrôle d'accès
+    compris) et l'aperçu de leurs cartes dans `list.cached_cards`.
+
+    Les filtres (voir `parse_card_filters`) sont appliqués une seule fois sur
+    la requête des cartes de tout le tableau. Le nombre de requêtes est fixe :
+    listes, cartes, labels, assignés.
+    """
+    load_board(board)
+    attach_card_previews(board.lists.all(), sort=sort, filters=filters)
+    return board
@@ -0,0 +1,133 @@
+from django.utils import timezone
+
+from .caching import board_catalog
+
+
+# Trois niveaux de sérialisation d'une carte :
+# - aperçu : champs de la preview en colonne (listes, diffusions temps réel)
+# - carte : corps du modal (checklists, commentaires...), sans catalogue
+# - détail : carte + catalogue des labels et des membres, à l'ouverture du modal
+
+
+def label_data(label):
+    return {"id": label.id, "name": label.name, "color": label.color}
+
+
+def user_data(user):
+    return {"id": user.id, "username": user.username, "initial": user.username[0].upper()}
+
+
+def _card_counts(card):
+    # Compteurs annotés par `card_preview_queryset`, sinon calculés sur les
+    # sous-tâches et commentaires préchargés (`_card_queryset`)
+    if hasattr(card, "comment_count"):
+        return card.completed_subtasks, card.total_subtasks, card.comment_count
+    subtasks = card.subtasks.all()
+    return sum(1 for s in subtasks if s.is_completed), len(subtasks), len(card.comments.all())
+
+
+def serialize_card_preview(card):
+    """Aperçu d'une carte, sans requête supplémentaire (labels et assignés préchargés)."""
+    completed, total, comment_count = _card_counts(card)
+    return {
+        "id": card.id,
+        "list_id": card.list_id,
+        "version": card.version,
+        "title": card.title,
+        "description": card.description or "",
+        "due_date": card.due_date.isoformat() if card.due_date else None,
+        "due_date_display": timezone.localtime(card.due_date).strftime("%d/%m/%Y %H:%M") if card.due_date else "",
+        "labels": [label_data(label) for label in card.labels.all()],
+        "assigned_users": [user_data(u) for u in card.assigned_to.all()],
+        "completed_subtasks": completed,
+        "total_subtasks": total,
+        "comment_count": comment_count,
+    }
+
+
+PREVIEW_FIELDS = (
+    "title", "description", "due_date", "due_date_display",
+    "labels", "assigned_users", "completed_subtasks", "total_subtasks", "comment_count",
+)
+
+
+def card_delta(data, fields=None):
+    """
+    Contenu d'un événement `card.updated`, extrait d'une carte déjà sérialisée :
+    seuls les champs d'aperçu `fields` (tous par défaut), avec la version.
+
+    Chaque modification incrémente la version d'exactement un : le delta
+    s'applique à `base_version`. Un client qui n'est pas à cette version a
+    manqué un événement et recharge la carte.
+    """
+    delta = {
+        "id": data["id"],
+        "list_id": data["list_id"],
+        "version": data["version"],
+        "base_version": data["version"] - 1,
+    }
+    for field in PREVIEW_FIELDS if fields is None else fields:
+        delta[field] = data[field]
+    return delta
+
+
+def serialize_card(card):
+    """Carte complète pour le modal, chargée par `_card_queryset`."""
+    checklists = []
+    for cl in card.checklists.all():
+        items = [
+            {"id": item.id, "title": item.title, "is_completed": item.is_completed}
+            for item in cl.items.all()
+        ]
+        total = len(items)
+        completed = sum(1 for item in items if item["is_completed"])
+        percent = int((completed / total * 100)) if total > 0 else 0
+        checklists.append({
+            "id": cl.id,
+            "title": cl.title,
+            "items": items,
+            "total_items": total,
+            "completed_items": completed,
+            "percent": percent
+        })
+
+    # Legacy subtasks (without checklist)
+    standalone_subtasks = [
+        {"id": subtask.id, "title": subtask.title, "is_completed": subtask.is_completed}
+        for subtask in card.subtasks.all() if subtask.checklist_id is None
+    ]
+
+    comments = [
+        {
+            "id": comment.id,
+            "author": comment.author.get_full_name() or comment.author.username,
+            "content": comment.content,
+            "created_at": comment.created_at.strftime("%d/%m/%Y %H:%M"),
+        }
+        for comment in card.comments.all()
+    ]
+
+    data = serialize_card_preview(card)
+    data.update({
+        "board_id": card.list.board_id,
+        "due_date_local": timezone.localtime(card.due_date).strftime("%Y-%m-%dT%H:%M") if card.due_date else "",
+        "checklists": checklists,
+        "subtasks": standalone_subtasks, # compatibility
+        "comments": comments,
+    })
+    return data
+
+
+def serialize_card_detail(card):
+    """Carte complète et catalogue des labels / membres du tableau (ouverture du modal)."""
+    data = serialize_card(card)
+    catalog = board_catalog(card.list.board)
+    label_ids = {label["id"] for label in data["labels"]}
+    data["available_labels"] = [
+        {**label, "assigned": label["id"] in label_ids} for label in catalog["labels"]
+    ]
+    assigned_ids = {u["id"] for u in data["assigned_users"]}
+    data["members"] = [
+        {**member, "is_assigned": member["id"] in assigned_ids} for member in catalog["members"]
+    ]
+    return data
@@ -0,0 +1,43 @@
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from .access import invalidate_board_access, sync_board_access
+from .models import Board, BoardAccess
+
+
+# Table BoardAccess tenue à jour depuis Board.owner et Board.members, quel que
+# soit le chemin de la modification (vues, admin, shell, seed). Les rôles en
+# cache des tableaux touchés sont invalidés dans la foulée.
+
+
+@receiver(post_save, sender=Board)
+def board_saved(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        BoardAccess.objects.create(board=instance, user_id=instance.owner_id, role=BoardAccess.OWNER)
+    elif update_fields is None or "owner" in update_fields:
+        sync_board_access([instance.pk])
+    else:
+        return
+    invalidate_board_access(instance.pk)
+
+
+@receiver(m2m_changed, sender=Board.members.through)
+def board_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # user.joined_boards.clear() : les tableaux concernés ne sont plus connus après coup
+        instance._cleared_board_ids = list(instance.joined_boards.values_list("pk", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        board_ids = [instance.pk]
+    elif action == "post_clear":
+        board_ids = instance.__dict__.pop("_cleared_board_ids", [])
+    else:
+        board_ids = list(pk_set or ())
+    if board_ids:
+        sync_board_access(board_ids)
+        for board_id in board_ids:
+            invalidate_board_access(board_id)
@@ -0,0 +1,72 @@
+// Décodeur MessagePack minimal pour les trames WebSocket `epitrello.msgpack`.
+// Servi depuis nos fichiers statiques : aucun script tiers n'est chargé sur la
+// page du tableau. Le client n'envoie que du JSON, seul `decode` est fourni.
+(() => {
+  const utf8 = new TextDecoder()
+
+  const decode = (bytes) => {
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength)
+    let offset = 0
+
+    const take = (length) => {
+      if (offset + length > bytes.length) throw new RangeError('Trame MessagePack tronquée')
+      const start = offset
+      offset += length
+      return start
+    }
+    const str = (length) => utf8.decode(bytes.subarray(take(length), offset))
+    const bin = (length) => bytes.slice(take(length), offset)
+    const array = (length) => Array.from({ length }, () => read())
+    const map = (length) => {
+      const result = {}
+      for (let n = 0; n < length; n++) {
+        const key = read()
+        result[key] = read()
+      }
+      return result
+    }
+    const uint64 = (at) => view.getUint32(at) * 2 ** 32 + view.getUint32(at + 4)
+    const int64 = (at) => view.getInt32(at) * 2 ** 32 + view.getUint32(at + 4)
+
+    const read = () => {
+      const type = bytes[take(1)]
+      if (type <= 0x7f) return type
+      if (type <= 0x8f) return map(type & 0x0f)
+      if (type <= 0x9f) return array(type & 0x0f)
+      if (type <= 0xbf) return str(type & 0x1f)
+      if (type >= 0xe0) return type - 0x100
+      switch (type) {
+        case 0xc0: return null
+        case 0xc2: return false
+        case 0xc3: return true
+        case 0xc4: return bin(bytes[take(1)])
+        case 0xc5: return bin(view.getUint16(take(2)))
+        case 0xc6: return bin(view.getUint32(take(4)))
+        case 0xca: return view.getFloat32(take(4))
+        case 0xcb: return view.getFloat64(take(8))
+        case 0xcc: return bytes[take(1)]
+        case 0xcd: return view.getUint16(take(2))
+        case 0xce: return view.getUint32(take(4))
+        case 0xcf: return uint64(take(8))
+        case 0xd0: return view.getInt8(take(1))
+        case 0xd1: return view.getInt16(take(2))
+        case 0xd2: return view.getInt32(take(4))
+        case 0xd3: return int64(take(8))
+        case 0xd9: return str(bytes[take(1)])
+        case 0xda: return str(view.getUint16(take(2)))
+        case 0xdb: return str(view.getUint32(take(4)))
+        case 0xdc: return array(view.getUint16(take(2)))
+        case 0xdd: return array(view.getUint32(take(4)))
+        case 0xde: return map(view.getUint16(take(2)))
+        case 0xdf: return map(view.getUint32(take(4)))
+        default: throw new TypeError(`Type MessagePack non pris en charge : 0x${type.toString(16)}`)
+      }
+    }
+
+    const value = read()
+    if (offset !== bytes.length) throw new RangeError('Octets en trop après la trame MessagePack')
+    return value
+  }
+
+  window.MessagePack = { decode }
+})()
@@ -1,4 +1,6 @@
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.urls import reverse
 from boards.models import Board, List, Card, Label, Comment, Notification
@@ -27,8 +29,7 @@ class ReorderTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.list1.refresh_from_db()
         self.list2.refresh_from_db()
-        self.assertEqual(self.list2.position, 1)
-        self.assertEqual(self.list1.position, 2)
+        self.assertLess(self.list2.position, self.list1.position)
 
     def test_reorder_lists_invalid_json(self):
         """Test de réordonnancement avec JSON invalide"""
@@ -56,8 +57,7 @@ class ReorderTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.card1.refresh_from_db()
         self.card2.refresh_from_db()
-        self.assertEqual(self.card2.position, 1)
-        self.assertEqual(self.card1.position, 2)
+        self.assertLess(self.card2.position, self.card1.position)
 
     def test_reorder_cards_move_to_different_list(self):
         """Test de déplacement de carte vers une autre liste"""
@@ -74,12 +74,63 @@ class ReorderTests(TestCase):
         self.card1.refresh_from_db()
         self.assertEqual(self.card1.list_id, self.list2.id)
 
+    def test_reorder_cards_single_update_statement(self):
+        """Le réordonnancement écrit toutes les cartes en une instruction, quelle que soit la taille de la liste"""
+        for i in range(3, 103):
+            Card.objects.create(title=f"Card {i}", list=self.list1, position=i)
+        card_ids = list(self.list1.cards.order_by("position").values_list("id", flat=True))
+        card_ids.reverse()
+        url = reverse("boards:reorder_cards", kwargs={"board_id": self.board.id})
+        payload = {"lists": [{"id": self.list1.id, "card_ids": card_ids}]}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, data=json.dumps(payload), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        card_updates = [q for q in ctx.captured_queries if q["sql"].startswith('UPDATE "boards_card"')]
+        self.assertEqual(len(card_updates), 1)
+        self.assertEqual(list(self.list1.cards.order_by("position").values_list("id", flat=True)), card_ids)
+
+    def test_reorder_cards_ignores_foreign_cards(self):
+        """Les cartes d'un autre tableau ne sont pas déplacées"""
+        other_board = Board.objects.create(title="Other", owner=User.objects.create_user(username="other"))
+        other_card = Card.objects.create(
+            title="Other", list=List.objects.create(title="L", board=other_board, position=1), position=7
+        )
+        url = reverse("boards:reorder_cards", kwargs={"board_id": self.board.id})
+        payload = {"lists": [{"id": self.list2.id, "card_ids": [other_card.id, self.card1.id]}]}
+        response = self.client.post(url, data=json.dumps(payload), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        other_card.refresh_from_db()
+        self.card1.refresh_from_db()
+        self.assertEqual((other_card.list.board_id, other_card.position), (other_board.id, 7))
+        self.assertEqual(self.card1.list_id, self.list2.id)
+
     def test_reorder_cards_invalid_json(self):
         """Test de réordonnancement de cartes avec JSON invalide"""
         url = reverse("boards:reorder_cards", kwargs={"board_id": self.board.id})
         response = self.client.post(url, data="invalid", content_type="application/json")
         self.assertEqual(response.status_code, 400)
 
+    def test_reorder_cards_non_object_payload(self):
+        """Un JSON valide qui n'est pas un objet est refusé"""
+        url = reverse("boards:reorder_cards", kwargs={"board_id": self.board.id})
+        response = self.client.post(url, data=json.dumps([1, 2]), content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_reorder_cards_checks_ownership_in_one_query(self):
+        """Cartes et listes de destination sont vérifiées en une seule requête"""
+        url = reverse("boards:reorder_cards", kwargs={"board_id": self.board.id})
+        payload = {"lists": [{"id": self.list2.id, "card_ids": [self.card1.id]}]}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, data=json.dumps(payload), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        lookups = [
+            q["sql"] for q in ctx.captured_queries
+            if q["sql"].startswith("SELECT") and ('FROM "boards_card"' in q["sql"] or 'FROM "boards_list"' in q["sql"])
+        ]
+        self.assertEqual(len(lookups), 1)
+        self.card1.refresh_from_db()
+        self.assertEqual(self.card1.list_id, self.list2.id)
+
     def test_reorder_cards_invalid_lists_format(self):
         """Test de réordonnancement avec format invalide"""
         url = reverse("boards:reorder_cards", kwargs={"board_id": self.board.id})
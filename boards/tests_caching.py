@@ -0,0 +1,352 @@
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404
+from django.test import TestCase, Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.urls import reverse
+from .access import board_role, resolve_board
+from .caching import bump_board_version
+from .models import Board, BoardAccess, List, Card, Label
+from .queries import accessible_boards
+import io
+import json
+from unittest import mock
+
+
+class BoardFragmentCacheTests(TestCase):
+    """Cache versionné des colonnes de cartes de board_detail"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.client = Client()
+        self.client.login(username="testuser", password="password")
+        self.board = Board.objects.create(title="Test Board", owner=self.user)
+        self.list1 = List.objects.create(title="List 1", board=self.board, position=1)
+        self.list2 = List.objects.create(title="List 2", board=self.board, position=2)
+        self.card1 = Card.objects.create(title="Card 1", list=self.list1)
+        self.card2 = Card.objects.create(title="Card 2", list=self.list2)
+        self.url = reverse("boards:board_detail", kwargs={"board_id": self.board.id})
+
+    def _card_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        queries = [q["sql"] for q in ctx.captured_queries if 'FROM "boards_card"' in q["sql"]]
+        return queries, response
+
+    def test_unchanged_board_served_from_cache(self):
+        """Au second affichage, aucune carte n'est rechargée"""
+        first, _ = self._card_queries()
+        self.assertEqual(len(first), 1)
+        second, response = self._card_queries()
+        self.assertEqual(second, [])
+        self.assertContains(response, "Card 1")
+        self.assertContains(response, "Card 2")
+
+    def test_mutation_rerenders_only_touched_list(self):
+        """Une modification de carte ne recharge que sa liste"""
+        self._card_queries()
+        url = reverse("boards:update_card", kwargs={"board_id": self.board.id, "card_id": self.card1.id})
+        self.client.post(url, data=json.dumps({"title": "Card 1 bis"}), content_type="application/json")
+
+        queries, response = self._card_queries()
+        self.assertEqual(len(queries), 1)
+        self.assertRegex(queries[0], rf"IN \({self.list1.id}\)")
+        self.assertContains(response, "Card 1 bis")
+        self.assertContains(response, "Card 2")
+
+    def test_versions_bumped(self):
+        """Les mutations incrémentent la version du tableau et de la liste concernée"""
+        url = reverse("boards:delete_card", kwargs={"board_id": self.board.id, "card_id": self.card2.id})
+        self.client.post(url)
+        self.board.refresh_from_db()
+        self.list1.refresh_from_db()
+        self.list2.refresh_from_db()
+        self.assertEqual(self.board.version, 1)
+        self.assertEqual(self.list1.version, 0)
+        self.assertEqual(self.list2.version, 1)
+
+        self.client.post(reverse("boards:rename_board", kwargs={"board_id": self.board.id}), {"title": "Renamed"})
+        self.board.refresh_from_db()
+        self.assertEqual(self.board.version, 2)
+
+    def test_board_row_updated_last(self):
+        with CaptureQueriesContext(connection) as ctx:
+            bump_board_version(self.board.id, list_ids=[self.list1.id], card_ids=[self.card2.id])
+        updates = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 3)
+        self.assertTrue(updates[-1].startswith('UPDATE "boards_board"'))
+
+
+class ConditionalGetTests(TestCase):
+    """ETag et réponses 304 pour board_detail et card_detail"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.client = Client()
+        self.client.login(username="testuser", password="password")
+        self.board = Board.objects.create(title="Test Board", owner=self.user)
+        self.list = List.objects.create(title="List", board=self.board, position=1)
+        self.card = Card.objects.create(title="Card", list=self.list)
+        self.board_url = reverse("boards:board_detail", kwargs={"board_id": self.board.id})
+        self.card_url = reverse("boards:card_detail", kwargs={"board_id": self.board.id, "card_id": self.card.id})
+
+    def test_board_detail_not_modified(self):
+        """Revalidation du tableau sans changement : 304"""
+        # La première visite dépose le cookie CSRF, qui fait partie de l'ETag
+        self.client.get(self.board_url)
+        response = self.client.get(self.board_url)
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith('"b'))
+        response = self.client.get(self.board_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_board_detail_etag_changes_after_mutation(self):
+        """Une mutation du tableau invalide l'ETag"""
+        etag = self.client.get(self.board_url)["ETag"]
+        url = reverse("boards:update_card", kwargs={"board_id": self.board.id, "card_id": self.card.id})
+        self.client.post(url, data=json.dumps({"title": "Changed"}), content_type="application/json")
+        response = self.client.get(self.board_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Changed")
+
+    def test_card_detail_not_modified_without_loading_card(self):
+        """La revalidation du détail de carte ne construit pas le graphe préchargé"""
+        etag = self.client.get(self.card_url)["ETag"]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.card_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        board_queries = [q["sql"] for q in ctx.captured_queries if "boards_" in q["sql"]]
+        self.assertEqual(len(board_queries), 1)
+
+    def test_card_detail_etag_changes_after_card_mutation(self):
+        """Cocher une sous-tâche change l'ETag de la carte"""
+        etag = self.client.get(self.card_url)["ETag"]
+        url = reverse("boards:create_subtask", kwargs={"board_id": self.board.id, "card_id": self.card.id})
+        self.client.post(url, data=json.dumps({"title": "Step"}), content_type="application/json")
+        response = self.client.get(self.card_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total_subtasks"], 1)
+
+    def test_card_detail_no_access(self):
+        """Sans accès, pas d'ETag et toujours une 404"""
+        User.objects.create_user(username="stranger", password="password")
+        self.client.login(username="stranger", password="password")
+        response = self.client.get(self.card_url, HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(response.status_code, 404)
+
+
+class BoardCatalogCacheTests(TestCase):
+    """Catalogue labels / membres du modal de carte mis en cache par tableau"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="owner", password="password")
+        self.other = User.objects.create_user(username="other", password="password")
+        self.client = Client()
+        self.client.login(username="owner", password="password")
+        self.board = Board.objects.create(title="Test Board", owner=self.user)
+        self.list = List.objects.create(title="List", board=self.board, position=1)
+        self.card = Card.objects.create(title="Card", list=self.list)
+        Label.objects.create(name="Bug", color="#ff0000")
+        self.url = reverse("boards:card_detail", kwargs={"board_id": self.board.id, "card_id": self.card.id})
+
+    def _catalog_query_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(self.url).json()
+        count = sum(
+            1 for q in ctx.captured_queries
+            if 'FROM "boards_label" ORDER BY' in q["sql"] or 'FROM "auth_user" INNER JOIN "boards_boardaccess"' in q["sql"]
+        )
+        return count, data
+
+    def test_catalog_served_from_cache(self):
+        first, _ = self._catalog_query_count()
+        second, data = self._catalog_query_count()
+        self.assertEqual(first, 2)
+        self.assertEqual(second, 0)
+        self.assertEqual([label["name"] for label in data["available_labels"]], ["Bug"])
+
+    def test_invite_and_remove_member_invalidate_catalog(self):
+        self._catalog_query_count()
+        self.client.post(reverse("boards:invite_member", kwargs={"board_id": self.board.id}), {"username": "other"})
+        _, data = self._catalog_query_count()
+        self.assertEqual([m["username"] for m in data["members"]], ["other", "owner"])
+
+        self.client.post(reverse("boards:remove_member", kwargs={"board_id": self.board.id, "user_id": self.other.id}))
+        _, data = self._catalog_query_count()
+        self.assertEqual([m["username"] for m in data["members"]], ["owner"])
+
+    def test_catalog_invalidated_again_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse("boards:invite_member", kwargs={"board_id": self.board.id}), {"username": "other"})
+        # Lecture concurrente avant le commit : le catalogue est remis en cache
+        self._catalog_query_count()
+        for callback in callbacks:
+            callback()
+        count, _ = self._catalog_query_count()
+        self.assertEqual(count, 2)
+
+    def test_create_label_invalidates_catalog(self):
+        self._catalog_query_count()
+        url = reverse("boards:create_label", kwargs={"board_id": self.board.id, "card_id": self.card.id})
+        response = self.client.post(url, data=json.dumps({"name": "Feature"}), content_type="application/json")
+        names = [label["name"] for label in response.json()["available_labels"]]
+        self.assertEqual(names, ["Bug", "Feature"])
+
+
+class BoardAccessCacheTests(TestCase):
+    """Rôle d'un utilisateur sur un tableau mis en cache, invalidé par les changements de membres"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="owner", password="password")
+        self.other = User.objects.create_user(username="other", password="password")
+        self.client = Client()
+        self.client.login(username="owner", password="password")
+        self.board = Board.objects.create(title="Test Board", owner=self.user)
+
+    def test_role_served_from_cache(self):
+        self.assertEqual(board_role(self.user, self.board.id), "owner")
+        self.assertIsNone(board_role(self.other, self.board.id))
+        # L'absence d'accès est mise en cache elle aussi
+        with self.assertNumQueries(0):
+            self.assertEqual(board_role(self.user, self.board.id), "owner")
+            self.assertIsNone(board_role(self.other, self.board.id))
+
+    def test_invite_and_remove_member_invalidate_role(self):
+        self.assertIsNone(board_role(self.other, self.board.id))
+        self.client.post(reverse("boards:invite_member", kwargs={"board_id": self.board.id}), {"username": "other"})
+        self.assertEqual(board_role(self.other, self.board.id), "member")
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post(reverse("boards:remove_member", kwargs={"board_id": self.board.id, "user_id": self.other.id}))
+        self.assertIsNone(board_role(self.other, self.board.id))
+        self.assertTrue(callbacks)
+
+    def test_member_cannot_manage_members(self):
+        self.board.members.add(self.other)
+        self.client.login(username="other", password="password")
+        response = self.client.post(
+            reverse("boards:remove_member", kwargs={"board_id": self.board.id, "user_id": self.other.id})
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_removing_owner_or_non_member_rejected(self):
+        with mock.patch("boards.views.dispatch_access_revoked") as revoked:
+            for user in (self.user, self.other):
+                response = self.client.post(
+                    reverse("boards:remove_member", kwargs={"board_id": self.board.id, "user_id": user.id})
+                )
+                self.assertEqual(response.status_code, 400)
+        revoked.assert_not_called()
+        self.assertEqual(board_role(self.user, self.board.id), "owner")
+
+
+class BoardResolverTests(TestCase):
+    """Tableau et rôle résolus une fois par requête"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="owner", password="password")
+        self.other = User.objects.create_user(username="other", password="password")
+        self.board = Board.objects.create(title="Test Board", owner=self.user)
+
+    def _request(self, user):
+        request = RequestFactory().get("/")
+        request.user = user
+        return request
+
+    def test_cold_cache_loads_board_and_role_in_one_query(self):
+        request = self._request(self.user)
+        with self.assertNumQueries(1):
+            context = resolve_board(request, self.board.id)
+            self.assertEqual(context.board.owner, self.user)
+            self.assertTrue(context.is_owner)
+        with self.assertNumQueries(0):
+            self.assertIs(resolve_board(request, self.board.id), context)
+
+    def test_cached_role_defers_board_load(self):
+        board_role(self.user, self.board.id)
+        request = self._request(self.user)
+        with self.assertNumQueries(0):
+            context = resolve_board(request, self.board.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(context.board.title, "Test Board")
+
+    def test_no_access_raises_404(self):
+        with self.assertRaises(Http404):
+            resolve_board(self._request(self.other), self.board.id)
+
+    def test_view_reads_board_once(self):
+        client = Client()
+        client.login(username="owner", password="password")
+        with CaptureQueriesContext(connection) as ctx:
+            client.post(reverse("boards:rename_board", kwargs={"board_id": self.board.id}), {"title": "Renamed"})
+        board_selects = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('SELECT') and 'FROM "boards_board"' in q["sql"]]
+        self.assertEqual(len(board_selects), 1)
+
+
+class BoardAccessTableTests(TestCase):
+    """Table BoardAccess synchronisée avec Board.owner / Board.members"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="owner", password="password")
+        self.other = User.objects.create_user(username="other", password="password")
+        self.board = Board.objects.create(title="Test Board", owner=self.user)
+
+    def _rows(self):
+        return set(BoardAccess.objects.filter(board=self.board).values_list("user__username", "role"))
+
+    def test_rows_follow_owner_and_members(self):
+        self.assertEqual(self._rows(), {("owner", "owner")})
+        self.board.members.add(self.other)
+        self.assertEqual(self._rows(), {("owner", "owner"), ("other", "member")})
+        self.other.joined_boards.remove(self.board)
+        self.assertEqual(self._rows(), {("owner", "owner")})
+        self.other.joined_boards.add(self.board)
+        self.other.joined_boards.clear()
+        self.assertEqual(self._rows(), {("owner", "owner")})
+
+    def test_owner_change_resyncs_roles(self):
+        self.board.members.add(self.user)
+        self.board.owner = self.other
+        self.board.save()
+        self.assertEqual(self._rows(), {("other", "owner"), ("owner", "member")})
+
+    def test_member_change_invalidates_cached_role(self):
+        self.assertIsNone(board_role(self.other, self.board.id))
+        self.board.members.add(self.other)
+        self.assertEqual(board_role(self.other, self.board.id), "member")
+
+    def test_accessible_boards_uses_single_join(self):
+        self.board.members.add(self.user)
+        sql = str(accessible_boards(self.user).query).upper()
+        self.assertNotIn("DISTINCT", sql)
+        self.assertNotIn(" OR ", sql)
+        self.assertEqual(list(accessible_boards(self.user)), [self.board])
+
+    def test_views_and_role_lookup_use_accessible_boards(self):
+        client = Client()
+        client.login(username="owner", password="password")
+        with mock.patch("boards.views.accessible_boards", wraps=accessible_boards) as views_helper, \
+                mock.patch("boards.access.accessible_boards", wraps=accessible_boards) as access_helper:
+            client.get(reverse("boards:board_list"))
+            client.get(reverse("boards:global_search"), {"q": "Test"})
+            board_role(self.other, self.board.id)
+        self.assertEqual(views_helper.call_count, 3)
+        access_helper.assert_called_once_with(self.other)
+
+    def test_backfill_command_restores_rows(self):
+        self.board.members.add(self.other)
+        BoardAccess.objects.all().delete()
+        BoardAccess.objects.create(board=self.board, user=self.other, role=BoardAccess.OWNER)
+        out = io.StringIO()
+        call_command("backfill_board_access", stdout=out)
+        self.assertEqual(self._rows(), {("owner", "owner"), ("other", "member")})
+        self.assertIn("2 accès créés ou corrigés", out.getvalue())
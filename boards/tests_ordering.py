@@ -0,0 +1,195 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from unittest import mock
+from .caching import render_list_fragments
+from .models import Board, List, Card
+from .ordering import DENSE_GAP, POSITION_STEP, plan_positions, position_between, rebalance
+import json
+
+
+class PlanPositionsTests(SimpleTestCase):
+    """Positions espacées : un déplacement n'écrit qu'un élément"""
+
+    def test_single_move_changes_one_item(self):
+        current = {n: n * POSITION_STEP for n in range(1, 101)}
+        ids = [50] + [n for n in range(1, 101) if n != 50]
+        changes, dense = plan_positions(ids, current)
+        self.assertEqual(changes, {50: 0})
+        self.assertFalse(dense)
+
+    def test_item_from_another_container_slotted_between(self):
+        changes, _ = plan_positions([1, 99, 2], {1: 1024, 2: 2048})
+        self.assertEqual(changes, {99: 1536})
+
+    def test_exhausted_gap_renumbers(self):
+        changes, _ = plan_positions([1, 99, 2], {1: 1024, 2: 1025})
+        self.assertEqual(changes, {99: 2 * POSITION_STEP, 2: 3 * POSITION_STEP})
+
+    def test_tight_gap_flagged_dense(self):
+        _, dense = plan_positions([1, 99, 2], {1: 1024, 2: 1024 + DENSE_GAP})
+        self.assertTrue(dense)
+
+    def test_position_between(self):
+        self.assertEqual(position_between(None, None), POSITION_STEP)
+        self.assertEqual(position_between(None, 1024), 0)
+        self.assertEqual(position_between(1024, None), 2048)
+        self.assertEqual(position_between(1024, 2048), 1536)
+        self.assertIsNone(position_between(1024, 1025))
+
+
+class SpacedPositionViewTests(TestCase):
+    """Création et réordonnancement avec positions espacées"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="owner", password="password")
+        self.client = Client()
+        self.client.login(username="owner", password="password")
+        self.board = Board.objects.create(title="Board", owner=self.user)
+        self.list = List.objects.create(title="List", board=self.board, position=POSITION_STEP)
+
+    def test_create_card_appends_with_gap(self):
+        url = reverse("boards:create_card", kwargs={"board_id": self.board.id})
+        for title in ("A", "B"):
+            self.client.post(url, {"list_id": self.list.id, "title": title})
+        self.assertEqual(list(self.list.cards.values_list("position", flat=True)), [POSITION_STEP, 2 * POSITION_STEP])
+
+    def test_create_list_appends_with_gap(self):
+        self.client.post(reverse("boards:create_list", kwargs={"board_id": self.board.id}), {"title": "Next"})
+        self.assertEqual(self.board.lists.get(title="Next").position, 2 * POSITION_STEP)
+
+    def test_reorder_writes_only_moved_card(self):
+        cards = [Card.objects.create(title=f"C{n}", list=self.list, position=n * POSITION_STEP) for n in range(1, 51)]
+        before = dict(self.list.cards.values_list("id", "position"))
+        order = [cards[30].id] + [card.id for card in cards if card != cards[30]]
+        url = reverse("boards:reorder_cards", kwargs={"board_id": self.board.id})
+        self.client.post(url, data=json.dumps({"lists": [{"id": self.list.id, "card_ids": order}]}), content_type="application/json")
+        after = dict(self.list.cards.values_list("id", "position"))
+        self.assertEqual([card_id for card_id in after if after[card_id] != before[card_id]], [cards[30].id])
+        self.assertEqual(list(self.list.cards.values_list("id", flat=True)), order)
+
+    @override_settings(BOARD_POSITIONS_ASYNC_REBALANCE=False)
+    def test_dense_list_rebalanced_after_commit(self):
+        first = Card.objects.create(title="A", list=self.list, position=POSITION_STEP)
+        last = Card.objects.create(title="B", list=self.list, position=POSITION_STEP + 4)
+        moved = Card.objects.create(title="C", list=self.list, position=5 * POSITION_STEP)
+        url = reverse("boards:reorder_cards", kwargs={"board_id": self.board.id})
+        payload = {"lists": [{"id": self.list.id, "card_ids": [first.id, moved.id, last.id]}]}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, data=json.dumps(payload), content_type="application/json")
+        self.assertEqual(
+            list(self.list.cards.values_list("id", "position")),
+            [(first.id, POSITION_STEP), (moved.id, 2 * POSITION_STEP), (last.id, 3 * POSITION_STEP)],
+        )
+
+    def test_rebalance_keeps_order(self):
+        for n, position in enumerate((5, 5, 6, 100)):
+            Card.objects.create(title=f"C{n}", list=self.list, position=position)
+        order = list(self.list.cards.order_by("position", "id").values_list("id", flat=True))
+        self.assertEqual(rebalance(Card.objects.filter(list=self.list)), 4)
+        self.assertEqual(
+            list(self.list.cards.values_list("id", "position")),
+            [(card_id, (n + 1) * POSITION_STEP) for n, card_id in enumerate(order)],
+        )
+
+    def test_rebalance_invalidates_cached_column(self):
+        cache.clear()
+        first = Card.objects.create(title="A", list=self.list, position=5)
+        Card.objects.create(title="B", list=self.list, position=6)
+        board_list = render_list_fragments([List.objects.get(pk=self.list.pk)], "position", timezone.now(), limit=1)[0]
+        self.assertIn(f'data-next-cursor="5:{first.id}"', board_list.cards_html)
+        board_version = Board.objects.get(pk=self.board.pk).version
+        rebalance(Card.objects.filter(list=self.list))
+        board_list = render_list_fragments([List.objects.get(pk=self.list.pk)], "position", timezone.now(), limit=1)[0]
+        self.assertIn(f'data-next-cursor="{POSITION_STEP}:{first.id}"', board_list.cards_html)
+        self.assertEqual(Board.objects.get(pk=self.board.pk).version, board_version + 1)
+
+    def test_list_rebalance_bumps_board_version(self):
+        List.objects.create(title="Next", board=self.board, position=POSITION_STEP + 1)
+        board_version = Board.objects.get(pk=self.board.pk).version
+        self.assertEqual(rebalance(List.objects.filter(board=self.board)), 1)
+        self.assertEqual(Board.objects.get(pk=self.board.pk).version, board_version + 1)
+
+
+class MoveCardTests(TestCase):
+    """Déplacement unitaire : une ligne écrite, un événement de taille fixe"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="owner", password="password")
+        self.client = Client()
+        self.client.login(username="owner", password="password")
+        self.board = Board.objects.create(title="Board", owner=self.user)
+        self.todo = List.objects.create(title="Todo", board=self.board, position=POSITION_STEP)
+        self.done = List.objects.create(title="Done", board=self.board, position=2 * POSITION_STEP)
+        self.cards = [Card.objects.create(title=f"C{n}", list=self.todo, position=n * POSITION_STEP) for n in range(1, 21)]
+        self.target = Card.objects.create(title="D", list=self.done, position=POSITION_STEP)
+
+    def _move(self, card, **payload):
+        url = reverse("boards:move_card", kwargs={"board_id": self.board.id, "card_id": card.id})
+        return self.client.post(url, data=json.dumps(payload), content_type="application/json")
+
+    def test_move_writes_only_moved_card(self):
+        moved = self.cards[10]
+        before = dict(Card.objects.values_list("id", "position"))
+        with mock.patch("boards.views._send_board_event") as send:
+            response = self._move(moved, list_id=self.done.id, before_id=self.target.id)
+        self.assertEqual(response.status_code, 200)
+        after = dict(Card.objects.values_list("id", "position"))
+        self.assertEqual([card_id for card_id in after if after[card_id] != before[card_id]], [moved.id])
+        self.assertEqual(list(self.done.cards.values_list("id", flat=True)), [moved.id, self.target.id])
+        self.assertEqual(response.json()["version"], moved.version + 1)
+        send.assert_called_once_with(
+            self.board.id,
+            {
+                "action": "card.moved",
+                "card_id": moved.id,
+                "list_id": self.done.id,
+                "after_id": None,
+                "before_id": self.target.id,
+                "version": Card.objects.get(pk=moved.pk).version,
+            },
+            list_ids=[self.todo.id, self.done.id],
+        )
+
+    def test_move_after_neighbour_in_same_list(self):
+        moved = self.cards[0]
+        self._move(moved, list_id=self.todo.id, after_id=self.cards[4].id)
+        ids = list(self.todo.cards.values_list("id", flat=True))
+        self.assertEqual(ids[3:5], [self.cards[4].id, moved.id])
+
+    def test_move_without_neighbour_appends(self):
+        self._move(self.cards[0], list_id=self.done.id)
+        self.assertEqual(list(self.done.cards.values_list("id", flat=True)), [self.target.id, self.cards[0].id])
+
+    def test_move_without_room_renumbers_list(self):
+        Card.objects.filter(pk=self.target.pk).update(position=5)
+        follower = Card.objects.create(title="E", list=self.done, position=6)
+        response = self._move(self.cards[0], list_id=self.done.id, after_id=self.target.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(self.done.cards.values_list("id", flat=True)), [self.target.id, self.cards[0].id, follower.id]
+        )
+
+    def test_neighbour_outside_target_list_rejected(self):
+        response = self._move(self.cards[0], list_id=self.done.id, after_id=self.cards[1].id)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Card.objects.get(pk=self.cards[0].pk).list_id, self.todo.id)
+
+    def test_list_of_another_board_not_found(self):
+        other = Board.objects.create(title="Other", owner=self.user)
+        foreign = List.objects.create(title="Foreign", board=other, position=POSITION_STEP)
+        self.assertEqual(self._move(self.cards[0], list_id=foreign.id).status_code, 404)
+
+    def test_list_move_writes_one_row(self):
+        url = reverse("boards:reorder_lists", kwargs={"board_id": self.board.id})
+        with mock.patch("boards.views._send_board_event") as send:
+            self.client.post(
+                url, data=json.dumps({"list_id": self.done.id, "before_id": self.todo.id}), content_type="application/json"
+            )
+        self.assertEqual(list(self.board.lists.values_list("id", flat=True)), [self.done.id, self.todo.id])
+        self.assertEqual(List.objects.get(pk=self.todo.pk).position, POSITION_STEP)
+        send.assert_called_once_with(
+            self.board.id, {"action": "list.moved", "list_id": self.done.id, "after_id": None, "before_id": self.todo.id}
+        )
@@ -0,0 +1,391 @@
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from .models import Board, List, Card, Label, Subtask, Comment, Checklist, Notification
+from .queries import filter_cards
+
+
+@override_settings(BOARD_FRAGMENT_CACHE_TIMEOUT=0)
+class BoardSnapshotTests(TestCase):
+    """Nombre de requêtes de board_detail indépendant du volume de cartes"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.client = Client()
+        self.client.login(username="testuser", password="password")
+        self.board = Board.objects.create(title="Test Board", owner=self.user)
+        self.list1 = List.objects.create(title="List 1", board=self.board, position=1)
+        self.list2 = List.objects.create(title="List 2", board=self.board, position=2)
+        self.url = reverse("boards:board_detail", kwargs={"board_id": self.board.id})
+
+    def _add_cards(self, board_list, count):
+        for i in range(count):
+            card = Card.objects.create(title=f"Card {i}", list=board_list, position=i)
+            Subtask.objects.create(card=card, title="Done", is_completed=True)
+            Subtask.objects.create(card=card, title="Todo")
+            for _ in range(3):
+                Comment.objects.create(card=card, author=self.user, content="c")
+
+    def _count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_query_count_is_constant(self):
+        """Le nombre de requêtes ne dépend pas du nombre de cartes"""
+        self._add_cards(self.list1, 1)
+        small, _ = self._count_queries()
+        self._add_cards(self.list1, 10)
+        self._add_cards(self.list2, 10)
+        large, _ = self._count_queries()
+        self.assertEqual(small, large)
+
+    def test_counts_are_annotated(self):
+        """Les compteurs de sous-tâches et commentaires sont calculés en SQL"""
+        self._add_cards(self.list1, 2)
+        _, response = self._count_queries()
+        board_lists = response.context["board"].lists.all()
+        self.assertEqual([l.id for l in board_lists], [self.list1.id, self.list2.id])
+        card = board_lists[0].cached_cards[0]
+        self.assertEqual(card.total_subtasks, 2)
+        self.assertEqual(card.completed_subtasks, 1)
+        self.assertEqual(card.comment_count, 3)
+        self.assertEqual(board_lists[1].cached_cards, [])
+
+    def test_text_filter(self):
+        """Le filtre ?q= s'applique sans casser le regroupement par liste"""
+        Card.objects.create(title="Alpha", list=self.list1)
+        Card.objects.create(title="Beta", list=self.list2)
+        response = self.client.get(self.url, {"q": "alp"})
+        board_lists = response.context["board"].lists.all()
+        self.assertEqual([c.title for c in board_lists[0].cached_cards], ["Alpha"])
+        self.assertEqual(board_lists[1].cached_cards, [])
+
+
+class BoardFilterTests(TestCase):
+    """Filtres de cartes appliqués en une seule requête pour tout le tableau"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.other = User.objects.create_user(username="other", password="password")
+        self.client = Client()
+        self.client.login(username="testuser", password="password")
+        self.board = Board.objects.create(title="Test Board", owner=self.user)
+        self.board.members.add(self.other)
+        self.lists = [
+            List.objects.create(title=f"List {i}", board=self.board, position=i)
+            for i in range(5)
+        ]
+        self.label = Label.objects.create(name="Bug", color="#ff0000")
+        self.url = reverse("boards:board_cards", kwargs={"board_id": self.board.id})
+
+    def test_filtered_query_count_does_not_grow_with_lists(self):
+        """Le filtre texte ne déclenche plus une requête par liste"""
+        for board_list in self.lists:
+            Card.objects.create(title="Match", list=board_list)
+        detail_url = reverse("boards:board_detail", kwargs={"board_id": self.board.id})
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(detail_url, {"q": "match"})
+        for i in range(5, 15):
+            board_list = List.objects.create(title=f"List {i}", board=self.board, position=i)
+            Card.objects.create(title="Match", list=board_list)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(detail_url, {"q": "match"})
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+
+    def test_filter_by_label_and_assignee(self):
+        """Filtres label et assigné combinés, résultat groupé par liste"""
+        tagged = Card.objects.create(title="Tagged", list=self.lists[0])
+        tagged.labels.add(self.label)
+        tagged.assigned_to.add(self.other)
+        only_label = Card.objects.create(title="Only label", list=self.lists[1])
+        only_label.labels.add(self.label)
+        Card.objects.create(title="Plain", list=self.lists[1])
+
+        response = self.client.get(self.url, {"label": self.label.id})
+        data = response.json()
+        self.assertEqual(len(data["lists"]), 5)
+        self.assertEqual([c["title"] for c in data["lists"][0]["cards"]], ["Tagged"])
+        self.assertEqual([c["title"] for c in data["lists"][1]["cards"]], ["Only label"])
+
+        response = self.client.get(self.url, {"label": self.label.id, "assignee": self.other.id})
+        titles = [c["title"] for l in response.json()["lists"] for c in l["cards"]]
+        self.assertEqual(titles, ["Tagged"])
+
+    def test_filter_by_due_date_range(self):
+        """Filtre sur une plage de dates d'échéance (bornes incluses)"""
+        now = timezone.now().replace(hour=12)
+        Card.objects.create(title="Past", list=self.lists[0], due_date=now - timezone.timedelta(days=10))
+        Card.objects.create(title="Soon", list=self.lists[0], due_date=now + timezone.timedelta(days=1))
+        Card.objects.create(title="No date", list=self.lists[0])
+        response = self.client.get(self.url, {
+            "due_from": now.date().isoformat(),
+            "due_to": (now + timezone.timedelta(days=2)).date().isoformat(),
+        })
+        titles = [c["title"] for c in response.json()["lists"][0]["cards"]]
+        self.assertEqual(titles, ["Soon"])
+
+    def test_filter_requires_access(self):
+        """Un utilisateur sans accès reçoit une 404"""
+        User.objects.create_user(username="stranger", password="password")
+        self.client.login(username="stranger", password="password")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(BOARD_CARDS_PAGE_SIZE=3, BOARD_FRAGMENT_CACHE_TIMEOUT=0)
+class CardPaginationTests(TestCase):
+    """Pagination par clé (position, id) et chargement progressif des colonnes"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.client = Client()
+        self.client.login(username="testuser", password="password")
+        self.board = Board.objects.create(title="Test Board", owner=self.user)
+        self.list = List.objects.create(title="List", board=self.board, position=1)
+        self.other_list = List.objects.create(title="Other", board=self.board, position=2)
+        # Positions en double pour vérifier le départage par id
+        self.cards = [
+            Card.objects.create(title=f"Card {i}", list=self.list, position=i // 2)
+            for i in range(8)
+        ]
+        Card.objects.create(title="Elsewhere", list=self.other_list, position=1)
+        self.url = reverse("boards:list_cards", kwargs={"board_id": self.board.id, "list_id": self.list.id})
+
+    def test_pages_through_all_cards(self):
+        """Les pages s'enchaînent sans doublon ni trou, puis le curseur s'arrête"""
+        seen = []
+        params = {}
+        while True:
+            data = self.client.get(self.url, params).json()
+            seen.extend(card["id"] for card in data["cards"])
+            if not data["next_cursor"]:
+                break
+            params = {"after": data["next_cursor"]}
+        self.assertEqual(seen, [card.id for card in self.cards])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"after": "nope"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_access(self):
+        User.objects.create_user(username="stranger", password="password")
+        self.client.login(username="stranger", password="password")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_board_detail_renders_first_page_only(self):
+        """La page du tableau ne rend que les premières cartes de chaque colonne"""
+        detail_url = reverse("boards:board_detail", kwargs={"board_id": self.board.id})
+        response = self.client.get(detail_url)
+        board_lists = response.context["board"].lists.all()
+        self.assertEqual([c.id for c in board_lists[0].cached_cards], [c.id for c in self.cards[:3]])
+        self.assertEqual(board_lists[0].next_cursor, f"1:{self.cards[2].id}")
+        self.assertIsNone(board_lists[1].next_cursor)
+        self.assertContains(response, 'data-cards-sentinel="%d"' % self.list.id)
+        self.assertNotContains(response, "Card 5")
+        self.assertContains(response, "Elsewhere")
+
+    def test_board_detail_query_count_bounded(self):
+        """Le nombre de requêtes ne dépend pas de la longueur des listes"""
+        detail_url = reverse("boards:board_detail", kwargs={"board_id": self.board.id})
+        with CaptureQueriesContext(connection) as short:
+            self.client.get(detail_url)
+        for i in range(20):
+            Card.objects.create(title=f"More {i}", list=self.list, position=100 + i)
+        with CaptureQueriesContext(connection) as long:
+            response = self.client.get(detail_url)
+        self.assertEqual(len(short.captured_queries), len(long.captured_queries))
+        self.assertEqual(len(response.context["board"].lists.all()[0].cached_cards), 3)
+
+
+class CardSerializerTierTests(TestCase):
+    """Le catalogue labels / membres n'est calculé qu'à l'ouverture du modal"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.client = Client()
+        self.client.login(username="testuser", password="password")
+        self.board = Board.objects.create(title="Test Board", owner=self.user)
+        self.list = List.objects.create(title="List", board=self.board, position=1)
+        self.card = Card.objects.create(title="Card", list=self.list)
+        self.subtask = Subtask.objects.create(card=self.card, title="Step")
+        Label.objects.create(name="Bug", color="#ff0000")
+
+    def _catalog_queries(self, ctx):
+        return [
+            q["sql"] for q in ctx.captured_queries
+            if 'FROM "boards_label" ORDER BY' in q["sql"] or 'FROM "auth_user" INNER JOIN "boards_boardaccess"' in q["sql"]
+        ]
+
+    def test_card_detail_includes_catalog(self):
+        url = reverse("boards:card_detail", kwargs={"board_id": self.board.id, "card_id": self.card.id})
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(url).json()
+        self.assertEqual([label["name"] for label in data["available_labels"]], ["Bug"])
+        self.assertEqual([m["username"] for m in data["members"]], ["testuser"])
+        self.assertEqual(len(self._catalog_queries(ctx)), 2)
+
+    def test_mutation_skips_catalog_lookups(self):
+        """Cocher une sous-tâche ne parcourt ni les labels ni les membres"""
+        url = reverse("boards:toggle_subtask", kwargs={
+            "board_id": self.board.id, "card_id": self.card.id, "subtask_id": self.subtask.id,
+        })
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url)
+        data = response.json()
+        self.assertEqual(data["completed_subtasks"], 1)
+        self.assertNotIn("available_labels", data)
+        self.assertNotIn("members", data)
+        self.assertEqual(self._catalog_queries(ctx), [])
+
+
+class CardMutationPipelineTests(TestCase):
+    """Accès et carte résolus une fois, carte rechargée et sérialisée une fois"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.client = Client()
+        self.client.login(username="testuser", password="password")
+        self.board = Board.objects.create(title="Test Board", owner=self.user)
+        self.list = List.objects.create(title="List", board=self.board, position=1)
+        self.card = Card.objects.create(title="Card", list=self.list)
+        self.subtask = Subtask.objects.create(card=self.card, title="Step")
+        self.url = reverse("boards:toggle_subtask", kwargs={
+            "board_id": self.board.id, "card_id": self.card.id, "subtask_id": self.subtask.id,
+        })
+
+    def _toggle(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 200)
+        return ctx.captured_queries
+
+    def test_card_loaded_once(self):
+        """Un seul chargement préchargé de la carte (le rechargement après modification)"""
+        queries = self._toggle()
+        card_selects = [
+            q["sql"] for q in queries
+            if q["sql"].startswith("SELECT") and 'FROM "boards_card"' in q["sql"]
+        ]
+        # accès + carte, puis rechargement
+        self.assertEqual(len(card_selects), 2)
+
+    def test_query_count_independent_of_card_content(self):
+        self._toggle()  # rôle mis en cache
+        small = len(self._toggle())
+        for i in range(5):
+            Comment.objects.create(card=self.card, author=self.user, content=f"c{i}")
+            Subtask.objects.create(card=self.card, title=f"s{i}")
+            self.card.labels.add(Label.objects.create(name=f"L{i}", color="#000000"))
+        self.assertEqual(small, len(self._toggle()))
+
+    def test_validation_error_skips_reload(self):
+        url = reverse("boards:update_card", kwargs={"board_id": self.board.id, "card_id": self.card.id})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, data="{}", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(any("UPDATE" in q["sql"] for q in ctx.captured_queries))
+
+    def test_requires_access(self):
+        User.objects.create_user(username="stranger", password="password")
+        self.client.login(username="stranger", password="password")
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 404)
+        self.subtask.refresh_from_db()
+        self.assertFalse(self.subtask.is_completed)
+
+
+class IndexUsageTests(TestCase):
+    """Plans d'exécution : les requêtes chaudes passent par les index composites (0005)"""
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            # Tables de test minuscules : sans cela, un parcours séquentiel est toujours moins cher
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.board = Board.objects.create(title="Board", owner=self.user)
+        self.list = List.objects.create(title="List", board=self.board, position=1)
+        self.card = Card.objects.create(title="Card", list=self.list, position=1, due_date=timezone.now())
+        self.checklist = Checklist.objects.create(title="Checklist", card=self.card)
+        Subtask.objects.create(card=self.card, checklist=self.checklist, title="Todo")
+        Comment.objects.create(card=self.card, author=self.user, content="c")
+        Notification.objects.create(user=self.user, message="m")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+
+    def test_board_detail_columns(self):
+        self.assertUsesIndex(self.board.lists.all(), "list_board_position_idx")
+        self.assertUsesIndex(self.list.cards.all(), "card_list_position_idx")
+
+    def test_notifications(self):
+        self.assertUsesIndex(self.user.notifications.filter(is_read=False), "notif_user_unread_idx")
+        self.assertUsesIndex(self.user.notifications.all()[:10], "notif_user_created_idx")
+
+    def test_card_modal(self):
+        self.assertUsesIndex(self.card.comments.all(), "comment_card_created_idx")
+        self.assertUsesIndex(self.checklist.items.filter(card=self.card), "subtask_card_checklist_pos_idx")
+
+    def test_due_date_filter(self):
+        cards = filter_cards(Card.objects.all(), {"due_from": timezone.now().date()})
+        self.assertUsesIndex(cards, "card_due_date_idx")
+
+
+@override_settings(BOARD_LIST_PAGE_SIZE=3)
+class BoardListPaginationTests(TestCase):
+    """Liste des tableaux : compteurs en sous-requêtes et pagination par clé"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.client = Client()
+        self.client.login(username="testuser", password="password")
+        self.boards = [Board.objects.create(title=f"Board {i}", owner=self.user) for i in range(7)]
+        self.url = reverse("boards:board_list")
+
+    def _page(self, **params):
+        response = self.client.get(self.url, params, HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(response.status_code, 200)
+        return [board.id for board in response.context["boards"]], response.context["next_cursor"]
+
+    def _all_pages(self, **params):
+        ids, cursor = self._page(**params)
+        while cursor:
+            page, cursor = self._page(after=cursor, **params)
+            ids += page
+        return ids
+
+    def test_pages_through_all_boards(self):
+        ids = self._all_pages()
+        self.assertEqual(ids, [board.id for board in reversed(self.boards)])
+        alphabetic = self._all_pages(sort="alphabetic")
+        self.assertEqual(alphabetic, [board.id for board in self.boards])
+
+    def test_counts_annotated(self):
+        board_list = List.objects.create(title="List", board=self.boards[-1], position=1)
+        for i in range(4):
+            Card.objects.create(title=f"Card {i}", list=board_list, position=i)
+        response = self.client.get(self.url)
+        first = response.context["boards"][0]
+        self.assertEqual((first.list_count, first.card_count), (1, 4))
+
+    def test_query_count_does_not_grow_with_content(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url)
+        for board in self.boards:
+            for i in range(3):
+                board_list = List.objects.create(title=f"List {i}", board=board, position=i)
+                Card.objects.create(title="Card", list=board_list)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(self.url)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"after": "nope"})
+        self.assertEqual(response.status_code, 400)
@@ -1,7 +1,21 @@
+import io
+import logging
+import threading
 from unittest.mock import patch
-from django.test import TestCase, Client
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from .events import (
+    BoardEventDispatcher,
+    board_event_seq,
+    board_events_since,
+    broadcast_message,
+    dispatch_board_event,
+    record_board_event,
+)
 from .models import Board, List, Card
 import json
 
@@ -25,25 +39,222 @@ class ChannelsBroadcastTests(TestCase):
 
     def test_update_card_triggers_broadcast(self):
         dummy = DummyLayer()
-        with patch("boards.views.get_channel_layer", return_value=dummy):
+        with patch("boards.events.get_channel_layer", return_value=dummy), self.captureOnCommitCallbacks(execute=True):
             url = reverse("boards:update_card", kwargs={"board_id": self.board.id, "card_id": self.card.id})
             payload = {"title": "C1 updated", "description": "d"}
             res = self.client.post(url, data=json.dumps(payload), content_type="application/json")
             self.assertEqual(res.status_code, 200)
-            # au moins un envoi broadcast
-            self.assertTrue(dummy.calls)
-            group, event = dummy.calls[-1]
-            self.assertEqual(group, f"board_{self.board.id}")
-            self.assertEqual(event.get("type"), "broadcast")
-            self.assertEqual(event.get("payload", {}).get("action"), "card.updated")
+        # au moins un envoi broadcast, une fois la transaction validée
+        self.assertTrue(dummy.calls)
+        group, event = dummy.calls[-1]
+        self.assertEqual(group, f"board_{self.board.id}")
+        self.assertEqual(event.get("type"), "broadcast")
+        self.assertEqual(event.get("payload", {}).get("action"), "card.updated")
 
     def test_delete_card_triggers_broadcast(self):
         dummy = DummyLayer()
-        with patch("boards.views.get_channel_layer", return_value=dummy):
+        with patch("boards.events.get_channel_layer", return_value=dummy), self.captureOnCommitCallbacks(execute=True):
             url = reverse("boards:delete_card", kwargs={"board_id": self.board.id, "card_id": self.card.id})
             res = self.client.post(url)
             self.assertEqual(res.status_code, 200)
-            self.assertTrue(dummy.calls)
-            group, event = dummy.calls[-1]
-            self.assertEqual(group, f"board_{self.board.id}")
-            self.assertEqual(event.get("payload", {}).get("action"), "card.deleted")
+        self.assertTrue(dummy.calls)
+        group, event = dummy.calls[-1]
+        self.assertEqual(group, f"board_{self.board.id}")
+        self.assertEqual(event.get("payload", {}).get("action"), "card.deleted")
+
+    def test_broadcast_carries_changed_fields_only(self):
+        """La diffusion ne porte que les champs modifiés et la version de la carte"""
+        dummy = DummyLayer()
+        with patch("boards.events.get_channel_layer", return_value=dummy), self.captureOnCommitCallbacks(execute=True):
+            url = reverse("boards:update_card", kwargs={"board_id": self.board.id, "card_id": self.card.id})
+            self.client.post(url, data=json.dumps({"title": "Renamed"}), content_type="application/json")
+        card = dummy.calls[-1][1]["payload"]["card"]
+        self.assertEqual(card, {
+            "id": self.card.id,
+            "list_id": self.list.id,
+            "version": 1,
+            "base_version": 0,
+            "title": "Renamed",
+            "description": "",
+            "due_date": None,
+            "due_date_display": "",
+        })
+
+    def test_delta_versions_follow_each_other(self):
+        """Chaque modification s'applique à la version produite par la précédente"""
+        dummy = DummyLayer()
+        with patch("boards.events.get_channel_layer", return_value=dummy), self.captureOnCommitCallbacks(execute=True):
+            for content in ("a", "b"):
+                url = reverse("boards:create_comment", kwargs={"board_id": self.board.id, "card_id": self.card.id})
+                res = self.client.post(url, data=json.dumps({"content": content}), content_type="application/json")
+        first, second = (event["payload"]["card"] for _, event in dummy.calls)
+        self.assertEqual(second["base_version"], first["version"])
+        self.assertEqual(second["comment_count"], 2)
+        self.assertNotIn("title", second)
+        self.assertEqual(res.json()["version"], second["version"])
+
+    def test_broadcast_reuses_response_payload(self):
+        """L'aperçu diffusé est extrait de la réponse, champ pour champ"""
+        dummy = DummyLayer()
+        with patch("boards.events.get_channel_layer", return_value=dummy), self.captureOnCommitCallbacks(execute=True):
+            url = reverse("boards:create_comment", kwargs={"board_id": self.board.id, "card_id": self.card.id})
+            res = self.client.post(url, data=json.dumps({"content": "Hello"}), content_type="application/json")
+        data = res.json()
+        card = dummy.calls[-1][1]["payload"]["card"]
+        self.assertEqual(card["comment_count"], 1)
+        self.assertEqual(card["base_version"], data["version"] - 1)
+        del card["base_version"]
+        self.assertEqual(card, {field: data[field] for field in card})
+
+
+class BoardEventDispatchTests(TestCase):
+    """Diffusion après commit, rien en cas de rollback"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username="owner", password="pass123!A")
+        self.board = Board.objects.create(title="B", owner=self.user)
+        self.list = List.objects.create(title="L", board=self.board, position=1)
+        self.card = Card.objects.create(title="C1", list=self.list)
+        self.client.login(username="owner", password="pass123!A")
+
+    def test_event_waits_for_commit(self):
+        dummy = DummyLayer()
+        with patch("boards.events.get_channel_layer", return_value=dummy):
+            with self.captureOnCommitCallbacks() as callbacks:
+                dispatch_board_event(self.board.id, {"action": "card.updated"})
+            self.assertEqual(dummy.calls, [])
+            for callback in callbacks:
+                callback()
+        seq = board_event_seq(self.board.id)
+        self.assertEqual(dummy.calls, [(f"board_{self.board.id}", broadcast_message({"action": "card.updated", "seq": seq}))])
+
+    def test_rolled_back_event_is_dropped(self):
+        dummy = DummyLayer()
+        with patch("boards.events.get_channel_layer", return_value=dummy), self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    dispatch_board_event(self.board.id, {"action": "card.updated"})
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(dummy.calls, [])
+
+
+@override_settings(BOARD_EVENT_LOG_SIZE=3)
+class BoardEventLogTests(TestCase):
+    """Événements numérotés et journal borné rejoué à la reconnexion"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_events_numbered_in_order(self):
+        seqs = [record_board_event(1, {"action": "card.updated", "n": i})["payload"]["seq"] for i in range(3)]
+        self.assertEqual(seqs, [1, 2, 3])
+        self.assertEqual(board_event_seq(1), 3)
+        self.assertEqual(board_event_seq(2), 0)
+
+    def test_missed_events_replayed(self):
+        for i in range(3):
+            record_board_event(1, {"action": "card.updated", "n": i})
+        frames, through = board_events_since(1, 1)
+        self.assertEqual([json.loads(frame)["n"] for frame in frames], [1, 2])
+        self.assertEqual(through, 3)
+        self.assertEqual(board_events_since(1, 3), ([], 3))
+
+    def test_exceeded_log_requires_reload(self):
+        for i in range(5):
+            record_board_event(1, {"action": "card.updated", "n": i})
+        self.assertEqual(board_events_since(1, 1), (None, 5))
+        frames, _ = board_events_since(1, 2)
+        self.assertEqual(len(frames), 3)
+        # Séquence en avance sur le serveur (cache vidé) : rechargement aussi
+        self.assertEqual(board_events_since(1, 9), (None, 5))
+
+    @override_settings(BOARD_EVENT_LOG_SIZE=500)
+    def test_full_log_fits_in_configured_cache(self):
+        """Le cache par défaut garde un journal complet sans évincer le compteur"""
+        for i in range(500):
+            record_board_event(1, {"action": "card.updated", "n": i})
+        frames, through = board_events_since(1, 0)
+        self.assertEqual(len(frames), 500)
+        self.assertEqual(through, 500)
+
+
+class SignalingLayer(DummyLayer):
+    def __init__(self, expected):
+        super().__init__()
+        self.expected = expected
+        self.done = threading.Event()
+
+    async def group_send(self, group, event):
+        await super().group_send(group, event)
+        if len(self.calls) >= self.expected:
+            self.done.set()
+
+
+@override_settings(BOARD_EVENTS_ASYNC=True)
+class BackgroundDispatchTests(TransactionTestCase):
+    """Envoi par le thread d'arrière-plan après un vrai commit"""
+
+    def test_events_sent_off_request_thread(self):
+        dispatcher = BoardEventDispatcher()
+        layer = SignalingLayer(expected=3)
+        with patch("boards.events.get_channel_layer", return_value=layer):
+            with transaction.atomic():
+                for i in range(3):
+                    dispatcher.dispatch(1, {"action": "card.updated", "n": i})
+                self.assertEqual(layer.calls, [])
+            self.assertTrue(layer.done.wait(5))
+        self.assertEqual([event["payload"]["n"] for _, event in layer.calls], [0, 1, 2])
+
+    def test_events_numbered_off_request_thread(self):
+        """Numérotation et journal faits par le thread d'envoi, dans l'ordre des commits"""
+        cache.clear()
+        dispatcher = BoardEventDispatcher()
+        layer = SignalingLayer(expected=3)
+        threads = []
+
+        def record(board_id, payload):
+            threads.append(threading.current_thread())
+            return record_board_event(board_id, payload)
+
+        with patch("boards.events.get_channel_layer", return_value=layer), patch("boards.events.record_board_event", side_effect=record):
+            for i in range(3):
+                with transaction.atomic():
+                    dispatcher.dispatch(1, {"action": "card.updated", "n": i})
+            self.assertTrue(layer.done.wait(5))
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertEqual([event["payload"]["seq"] for _, event in layer.calls], [1, 2, 3])
+
+
+class LoadTestCommandTests(TransactionTestCase):
+    """Test de charge lancé en miniature contre la base de test"""
+
+    def test_report_lines(self):
+        self.addCleanup(logging.disable, logging.NOTSET)
+        out = io.StringIO()
+        call_command("loadtest_ws", sockets=4, boards=2, events=3, timeout=10, stdout=out, stderr=io.StringIO())
+        report = out.getvalue()
+        self.assertIn("livraisons          6/6", report)
+        self.assertRegex(report, r"latence \(ms\)\s+p50 [\d.]+\s+p99 [\d.]+")
+        self.assertRegex(report, r"mémoire / socket\s+[\d.]+ Kio")
+        self.assertRegex(report, r"CPU / événement\s+[\d.]+ ms")
+        # Les données créées par la commande sont supprimées
+        self.assertFalse(Board.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+
+class BenchBroadcastCommandTests(TestCase):
+    """Mesure d'encodage lancée en miniature"""
+
+    def test_reports_both_timings(self):
+        self.addCleanup(logging.disable, logging.NOTSET)
+        out = io.StringIO()
+        call_command("bench_broadcast", sizes="1,3", repeat=2, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertIn("par connexion (ms)", lines[0])
+        self.assertIn("une fois (ms)", lines[0])
+        self.assertEqual([line.split()[0] for line in lines[1:]], ["1", "3"])
+        for line in lines[1:]:
+            self.assertRegex(line, r"^\s*\d+\s+[\d.]+\s+[\d.]+\s+[\d.]+x$")
@@ -1,9 +1,17 @@
+import asyncio
+import json
+
+import msgpack
+from asgiref.sync import sync_to_async
 from channels.testing import WebsocketCommunicator
 from channels.db import database_sync_to_async
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.contrib.auth.models import User
 from boards.models import Board
-from boards.consumers import BoardConsumer
+from django.urls import reverse
+from boards.consumers import BoardConsumer, coalesce_events, live_consumers, send_queue_metrics
+from boards.events import broadcast_message, record_board_event
 from channels.layers import get_channel_layer
 
 
@@ -150,3 +158,355 @@ class BoardConsumerTests(TestCase):
         self.assertEqual(response["data"], "test_data")
 
         await communicator.disconnect()
+
+
+class CoalesceEventsTests(SimpleTestCase):
+    """Fusion des événements en attente d'une connexion"""
+
+    def test_card_updates_merged(self):
+        events = [
+            {"action": "card.updated", "card": {"id": 1, "title": "A", "comment_count": 0}},
+            {"action": "card.deleted", "card_id": 2},
+            {"action": "card.updated", "card": {"id": 1, "comment_count": 3}},
+        ]
+        self.assertEqual(coalesce_events(events), [
+            {"action": "card.deleted", "card_id": 2},
+            {"action": "card.updated", "card": {"id": 1, "title": "A", "comment_count": 3}},
+        ])
+
+    def test_merged_delta_keeps_first_base_version(self):
+        events = [
+            {"action": "card.updated", "card": {"id": 1, "version": 5, "base_version": 4, "title": "A"}},
+            {"action": "card.updated", "card": {"id": 1, "version": 6, "base_version": 5, "comment_count": 1}},
+        ]
+        self.assertEqual(coalesce_events(events), [
+            {"action": "card.updated", "card": {"id": 1, "version": 6, "base_version": 4, "title": "A", "comment_count": 1}},
+        ])
+
+    def test_other_events_kept_in_order(self):
+        events = [
+            {"action": "card.updated", "card": {"id": 1}},
+            {"action": "card.updated", "card": {"id": 2}},
+            {"action": "lists.reordered", "order": [2, 1]},
+        ]
+        self.assertEqual(coalesce_events(events), events)
+
+
+@override_settings(BOARD_WS_COALESCE_MS=50)
+class CoalescedBroadcastTests(TestCase):
+    """Une seule trame par fenêtre de regroupement"""
+
+    async def test_burst_sent_as_one_frame(self):
+        owner = await database_sync_to_async(User.objects.create_user)(
+            username="owner", password="password"
+        )
+        board = await database_sync_to_async(Board.objects.create)(
+            title="Test Board", owner=owner
+        )
+        communicator = WebsocketCommunicator(BoardConsumer.as_asgi(), f"/ws/boards/{board.id}/")
+        communicator.scope['user'] = owner
+        communicator.scope['url_route'] = {'kwargs': {'board_id': board.id}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        channel_layer = get_channel_layer()
+        for title in ("A", "B", "C"):
+            await channel_layer.group_send(f"board_{board.id}", {
+                "type": "broadcast",
+                "payload": {"action": "card.updated", "card": {"id": 7, "title": title}},
+            })
+        await channel_layer.group_send(f"board_{board.id}", {
+            "type": "broadcast",
+            "payload": {"action": "list.deleted", "list_id": 3},
+        })
+
+        frame = await communicator.receive_json_from(timeout=1)
+        self.assertEqual(frame["action"], "batch")
+        self.assertEqual(frame["events"], [
+            {"action": "card.updated", "card": {"id": 7, "title": "C"}},
+            {"action": "list.deleted", "list_id": 3},
+        ])
+        self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+        await communicator.disconnect()
+
+
+@override_settings(BOARD_WS_COALESCE_MS=0)
+class PreEncodedBroadcastTests(TestCase):
+    """Les consumers transmettent la trame encodée par l'émetteur"""
+
+    async def test_text_frame_forwarded_as_is(self):
+        owner = await database_sync_to_async(User.objects.create_user)(
+            username="owner", password="password"
+        )
+        board = await database_sync_to_async(Board.objects.create)(
+            title="Test Board", owner=owner
+        )
+        communicator = WebsocketCommunicator(BoardConsumer.as_asgi(), f"/ws/boards/{board.id}/")
+        communicator.scope['user'] = owner
+        communicator.scope['url_route'] = {'kwargs': {'board_id': board.id}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        await get_channel_layer().group_send(f"board_{board.id}", {
+            "type": "broadcast",
+            "payload": {"action": "card.deleted", "card_id": 1},
+            "text": '{"action":"card.deleted","card_id":1}',
+        })
+        self.assertEqual(await communicator.receive_from(), '{"action":"card.deleted","card_id":1}')
+        await communicator.disconnect()
+
+
+@override_settings(BOARD_WS_COALESCE_MS=0)
+class MessagePackSubprotocolTests(TestCase):
+    """Sous-protocole binaire négocié à la connexion, JSON par défaut"""
+
+    async def _connect(self, subprotocols=None):
+        owner = await database_sync_to_async(User.objects.create_user)(
+            username="owner", password="password"
+        )
+        self.board = await database_sync_to_async(Board.objects.create)(
+            title="Test Board", owner=owner
+        )
+        communicator = WebsocketCommunicator(
+            BoardConsumer.as_asgi(), f"/ws/boards/{self.board.id}/", subprotocols=subprotocols
+        )
+        communicator.scope['user'] = owner
+        communicator.scope['url_route'] = {'kwargs': {'board_id': self.board.id}}
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator, subprotocol
+
+    async def test_msgpack_negotiated(self):
+        communicator, subprotocol = await self._connect(["epitrello.msgpack", "epitrello.json"])
+        self.assertEqual(subprotocol, "epitrello.msgpack")
+
+        await get_channel_layer().group_send(f"board_{self.board.id}", {
+            "type": "broadcast",
+            "payload": {"action": "card.deleted", "card_id": 1},
+            "text": '{"action":"card.deleted","card_id":1}',
+        })
+        frame = await communicator.receive_from()
+        self.assertIsInstance(frame, bytes)
+        self.assertEqual(msgpack.unpackb(frame), {"action": "card.deleted", "card_id": 1})
+
+        await communicator.send_to(bytes_data=msgpack.packb({"type": "ping"}))
+        self.assertEqual(msgpack.unpackb(await communicator.receive_from()), {"type": "pong"})
+        await communicator.disconnect()
+
+    async def test_json_stays_default(self):
+        communicator, subprotocol = await self._connect(["epitrello.json"])
+        self.assertEqual(subprotocol, "epitrello.json")
+        await communicator.send_json_to({"type": "ping"})
+        self.assertEqual(await communicator.receive_json_from(), {"type": "pong"})
+        await communicator.disconnect()
+
+
+@override_settings(BOARD_WS_COALESCE_MS=0)
+class AccessRevocationTests(TestCase):
+    """Les sockets d'un membre retiré sont fermées avec le code 4403"""
+
+    async def _connect(self, user, board):
+        communicator = WebsocketCommunicator(BoardConsumer.as_asgi(), f"/ws/boards/{board.id}/")
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'board_id': board.id}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_revoked_member_closed(self):
+        owner = await database_sync_to_async(User.objects.create_user)(username="owner", password="password")
+        member = await database_sync_to_async(User.objects.create_user)(username="member", password="password")
+        board = await database_sync_to_async(Board.objects.create)(title="Test Board", owner=owner)
+        await database_sync_to_async(board.members.add)(member)
+        owner_socket = await self._connect(owner, board)
+        member_socket = await self._connect(member, board)
+
+        await get_channel_layer().group_send(f"board_{board.id}", {"type": "access.revoked", "user_id": member.id})
+        self.assertEqual(await member_socket.receive_output(), {"type": "websocket.close", "code": 4403})
+        self.assertTrue(await owner_socket.receive_nothing(timeout=0.1))
+        await owner_socket.disconnect()
+
+    async def test_deleted_board_closes_everyone(self):
+        owner = await database_sync_to_async(User.objects.create_user)(username="owner", password="password")
+        board = await database_sync_to_async(Board.objects.create)(title="Test Board", owner=owner)
+        owner_socket = await self._connect(owner, board)
+
+        await get_channel_layer().group_send(f"board_{board.id}", {"type": "access.revoked", "user_id": None})
+        self.assertEqual(await owner_socket.receive_output(), {"type": "websocket.close", "code": 4403})
+
+
+@override_settings(BOARD_WS_COALESCE_MS=0, BOARD_EVENT_LOG_SIZE=3)
+class ResumeFromTests(TestCase):
+    """Rejeu des événements manqués à la reconnexion (`resume_from`)"""
+
+    async def _connect(self, query):
+        owner = await database_sync_to_async(User.objects.create_user)(username="owner", password="password")
+        self.board = await database_sync_to_async(Board.objects.create)(title="Test Board", owner=owner)
+        await sync_to_async(cache.clear)()
+        for i in range(4):
+            await sync_to_async(record_board_event)(self.board.id, {"action": "card.deleted", "card_id": i})
+        communicator = WebsocketCommunicator(BoardConsumer.as_asgi(), f"/ws/boards/{self.board.id}/?{query}")
+        communicator.scope['user'] = owner
+        communicator.scope['url_route'] = {'kwargs': {'board_id': self.board.id}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_missed_events_replayed_once(self):
+        communicator = await self._connect("resume_from=2")
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame["action"], "batch")
+        self.assertEqual([event["seq"] for event in frame["events"]], [3, 4])
+
+        # Déjà rejoué : ignoré s'il arrive aussi par le groupe
+        replayed = await sync_to_async(cache.get)(f"boards:events:{self.board.id}:4")
+        await get_channel_layer().group_send(f"board_{self.board.id}", {
+            "type": "broadcast", "payload": json.loads(replayed), "text": replayed,
+        })
+        self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+        await communicator.disconnect()
+
+    async def test_live_events_kept_after_sequence_reset(self):
+        communicator = await self._connect("resume_from=2")
+        await communicator.receive_json_from()
+
+        # Compteur perdu après le rejeu : la séquence repart de 1
+        await sync_to_async(cache.delete)(f"boards:events-seq:{self.board.id}")
+        for card_id in (10, 11, 12):
+            message = await sync_to_async(record_board_event)(self.board.id, {"action": "card.deleted", "card_id": card_id})
+            await get_channel_layer().group_send(f"board_{self.board.id}", message)
+            event = await communicator.receive_json_from()
+            self.assertEqual(event["card_id"], card_id)
+        await communicator.disconnect()
+
+    async def test_exceeded_log_sends_resync(self):
+        communicator = await self._connect("resume_from=0")
+        self.assertEqual(await communicator.receive_json_from(), {"action": "resync", "seq": 4})
+        await communicator.disconnect()
+
+
+@override_settings(BOARD_WS_HEARTBEAT_INTERVAL=0.05, BOARD_WS_IDLE_TIMEOUT=0.12)
+class HeartbeatTests(TestCase):
+    """Ping du serveur, connexions muettes fermées et retirées du groupe"""
+
+    async def _connect(self):
+        owner = await database_sync_to_async(User.objects.create_user)(username="owner", password="password")
+        self.board = await database_sync_to_async(Board.objects.create)(title="Test Board", owner=owner)
+        communicator = WebsocketCommunicator(BoardConsumer.as_asgi(), f"/ws/boards/{self.board.id}/")
+        communicator.scope['user'] = owner
+        communicator.scope['url_route'] = {'kwargs': {'board_id': self.board.id}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_answered_pings_keep_connection(self):
+        communicator = await self._connect()
+        for _ in range(4):
+            self.assertEqual(await communicator.receive_json_from(), {"type": "ping"})
+            await communicator.send_json_to({"type": "pong"})
+        await communicator.disconnect()
+
+    async def test_idle_connection_reaped(self):
+        communicator = await self._connect()
+        members = set(get_channel_layer().groups[f"board_{self.board.id}"])
+        self.assertEqual(await communicator.receive_json_from(), {"type": "ping"})
+        self.assertEqual(await communicator.receive_json_from(), {"type": "ping"})
+        self.assertEqual(await communicator.receive_output(), {"type": "websocket.close", "code": 4408})
+        # Le canal de la connexion fermée a quitté le groupe
+        remaining = set(get_channel_layer().groups.get(f"board_{self.board.id}", {}))
+        self.assertEqual(len(members - remaining), 1)
+
+
+class StalledClient:
+    """Client qui ne lit plus : les envois restent bloqués jusqu'à `gate.set()`"""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.sent = []
+
+    async def __call__(self, message):
+        if message["type"] == "websocket.send":
+            await self.gate.wait()
+        self.sent.append(message)
+
+
+def card_event(card_id, title, seq):
+    return broadcast_message({"action": "card.updated", "card": {"id": card_id, "title": title}, "seq": seq})
+
+
+@override_settings(BOARD_WS_COALESCE_MS=0, BOARD_WS_SEND_QUEUE_SIZE=3)
+class SendQueueLimitTests(TestCase):
+    """File d'envoi bornée par connexion et politique appliquée aux clients lents"""
+
+    async def _stalled_consumer(self):
+        consumer = BoardConsumer()
+        consumer.board_id = 1
+        consumer.group_name = "board_1"
+        consumer.channel_name = "stalled"
+        consumer.channel_layer = get_channel_layer()
+        consumer.pending_events = []
+        consumer.base_send = client = StalledClient()
+        # Un premier événement occupe l'envoi, les suivants attendent dans la file
+        await consumer.broadcast(card_event(1, "first", 1))
+        await asyncio.sleep(0)
+        self.assertEqual(consumer.queue_depth, 0)
+        return consumer, client
+
+    def _sent_payloads(self, client):
+        return [json.loads(message["text"]) for message in client.sent if message["type"] == "websocket.send"]
+
+    @override_settings(BOARD_WS_SEND_QUEUE_POLICY="coalesce")
+    async def test_superseded_events_dropped(self):
+        consumer, client = await self._stalled_consumer()
+        for seq in range(2, 8):
+            await consumer.broadcast(card_event(2, f"title {seq}", seq))
+        self.assertLessEqual(consumer.queue_depth, 3)
+
+        client.gate.set()
+        await consumer.flush_task
+        self.assertEqual(
+            [(p["card"]["id"], p["card"]["title"]) for p in self._sent_payloads(client)],
+            [(1, "first"), (2, "title 7")],
+        )
+
+    @override_settings(BOARD_WS_SEND_QUEUE_POLICY="resync")
+    async def test_overflow_collapsed_to_resync(self):
+        consumer, client = await self._stalled_consumer()
+        for seq in range(2, 6):
+            await consumer.broadcast(card_event(seq, "t", seq))
+        self.assertEqual(consumer.queue_depth, 1)
+        self.assertGreaterEqual(send_queue_metrics()["overflows"].get("resync", 0), 1)
+
+        client.gate.set()
+        await consumer.flush_task
+        self.assertEqual(self._sent_payloads(client)[-1], {"action": "resync", "seq": 5})
+
+    @override_settings(BOARD_WS_SEND_QUEUE_POLICY="disconnect")
+    async def test_overflow_disconnects(self):
+        consumer, client = await self._stalled_consumer()
+        for seq in range(2, 6):
+            await consumer.broadcast(card_event(seq, "t", seq))
+        self.assertEqual(client.sent[-1], {"type": "websocket.close", "code": 4429})
+        self.assertEqual(consumer.queue_depth, 0)
+        self.assertIsNone(consumer.flush_task)
+
+    async def test_queue_depth_metric(self):
+        consumer, _ = await self._stalled_consumer()
+        live_consumers.add(consumer)
+        await consumer.broadcast(card_event(2, "t", 2))
+        await consumer.broadcast(card_event(3, "t", 3))
+        metrics = send_queue_metrics()
+        self.assertGreaterEqual(metrics["queued_events"], 2)
+        self.assertGreaterEqual(metrics["max_queue_depth"], 2)
+        self.assertEqual(metrics["queue_limit"], 3)
+        consumer._cancel_tasks()
+        live_consumers.discard(consumer)
+
+    def test_metrics_view_staff_only(self):
+        User.objects.create_user(username="user", password="password")
+        User.objects.create_user(username="staff", password="password", is_staff=True)
+        url = reverse("boards:realtime_metrics")
+        self.client.login(username="user", password="password")
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.login(username="staff", password="password")
+        self.assertIn("max_queue_depth", self.client.get(url).json())
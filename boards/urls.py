@@ -7,6 +7,12 @@ urlpatterns = [
     path("", views.board_list, name="board_list"),
     path("search/", views.global_search, name="global_search"),
     path("board/<int:board_id>/", views.board_detail, name="board_detail"),
+    path("board/<int:board_id>/cards/", views.board_cards, name="board_cards"),
+    path(
+        "board/<int:board_id>/lists/<int:list_id>/cards/",
+        views.list_cards,
+        name="list_cards",
+    ),
     path(
         "board/<int:board_id>/lists/create",
         views.create_list,
@@ -50,8 +56,10 @@ urlpatterns = [
     path("board/<int:board_id>/cards/<int:card_id>/labels/create", views.create_label, name="create_label"),
     path("board/<int:board_id>/cards/<int:card_id>/labels/<int:label_id>/delete", views.delete_label, name="delete_label"),
     path("board/<int:board_id>/cards/<int:card_id>/delete", views.delete_card, name="delete_card"),
+    path("board/<int:board_id>/cards/<int:card_id>/move", views.move_card, name="move_card"),
     path("board/<int:board_id>/cards/<int:card_id>/assign", views.toggle_card_assignment, name="toggle_card_assignment"),
     path("boards/create", views.create_board, name="create_board"),
+    path("metrics/realtime/", views.realtime_metrics, name="realtime_metrics"),
     # Routes de test pour les pages d'erreur
     path("test-404/", views.test_404, name="test_404"),
     path("test-500/", views.test_500, name="test_500"),
@@ -1,44 +1,67 @@
+import hashlib
 import json
 import logging
 import re
 import csv
+from functools import wraps
+from django.conf import settings
 from django.http import HttpResponse
 from django.contrib import messages
 from django.contrib.auth import logout, login
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
-from django.db import transaction
-from django.db.models import Max, Min, Prefetch, Q
+from django.db.models import F, IntegerField, Prefetch, Q, Subquery, Value, prefetch_related_objects
 from django.http import Http404, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.http import require_POST, require_http_methods
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST, require_http_methods
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from django.urls import reverse
 from .models import Board, List, Card, Label, Subtask, Comment, Notification, Checklist
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from .access import invalidate_board_access, resolve_board
+from .consumers import send_queue_metrics
+from .events import board_event_seq, dispatch_board_event, dispatch_access_revoked
+from .serializers import card_delta, serialize_card, serialize_card_detail, serialize_card_preview
+from .caching import (
+    bump_board_version,
+    bump_labels_version,
+    invalidate_board_catalog,
+    labels_version,
+    render_list_fragments,
+)
+from .ordering import (
+    append_position,
+    move_annotations,
+    move_position,
+    plan_positions,
+    rebalance,
+    schedule_rebalance,
+)
+from .queries import (
+    accessible_boards,
+    annotate_board_counts,
+    build_board_snapshot,
+    card_preview_queryset,
+    load_board,
+    page_boards,
+    page_cards,
+    parse_board_cursor,
+    parse_card_filters,
+    parse_cursor,
+)
 
 from django.contrib.auth.views import PasswordChangeView
 from django.core.mail import send_mail
 
 logger = logging.getLogger(__name__)
 
-def _send_board_event(board_id: int, payload: dict):
-    try:
-        layer = get_channel_layer()
-        if not layer:
-            logger.warning(f"Impossible de diffuser l'événement : CHANNEL_LAYER non configuré.")
-            return
-        logger.debug(f"Diffusion d'un événement au groupe board_{board_id} : {payload.get('action')}")
-        async_to_sync(layer.group_send)(
-            f"board_{board_id}",
-            {"type": "broadcast", "payload": payload},
-        )
-    except Exception as e:
-        logger.error(f"Erreur lors de la diffusion de l'événement au tableau {board_id} : {e}")
-        pass
+def _send_board_event(board_id: int, payload: dict, list_ids=(), card_ids=()):
+    # Toute modification diffusée invalide les colonnes en cache et les ETags concernés
+    bump_board_version(board_id, list_ids, card_ids)
+    # Envoi après le commit, hors du chemin de la requête
+    dispatch_board_event(board_id, payload)
 
 
 class CustomPasswordChangeView(PasswordChangeView):
@@ -61,45 +84,45 @@ class CustomPasswordChangeView(PasswordChangeView):
         )
         return response
 
-def _annotate_boards(boards_qs):
-    boards = []
-    for board in boards_qs:
-        lists = list(board.lists.all())
-        card_count = sum(len(board_list.cards.all()) for board_list in lists)
-        board.list_count = len(lists)
-        board.card_count = card_count
-        boards.append(board)
-    return boards
+def _board_page_size():
+    return getattr(settings, "BOARD_LIST_PAGE_SIZE", 24) or 24
 
 
-def _ensure_board_access(request, board_id):
-    return get_object_or_404(Board, Q(owner=request.user) | Q(members=request.user), pk=board_id)
+def board_view(view):
+    """
+    Résout le tableau de l'URL avant la vue et les décorateurs suivants (ETag
+    compris) : `request.board_context` porte le rôle de l'utilisateur et le
+    tableau, chargés une fois pour la requête (voir `access.resolve_board`).
+    404 sans accès.
+    """
+    @wraps(view)
+    def wrapper(request, board_id, *args, **kwargs):
+        request.board_context = resolve_board(request, board_id)
+        return view(request, board_id, *args, **kwargs)
+    return wrapper
 
 
 @login_required
 def board_list(request):
-    boards_qs = (
-        Board.objects.select_related("owner")
-        .prefetch_related(
-            Prefetch("lists", queryset=List.objects.prefetch_related("cards"))
-        )
-    )
+    owner_filter = (request.GET.get("owner") or "me")
+    if owner_filter == "all" and request.user.is_staff:
+        boards_qs = Board.objects.all()
+    else:
+        boards_qs = accessible_boards(request.user)
+    boards_qs = annotate_board_counts(boards_qs.select_related("owner"))
     query = (request.GET.get("q") or "").strip()
     if query:
         boards_qs = boards_qs.filter(title__icontains=query)
-    owner_filter = (request.GET.get("owner") or "me")
-    if not (owner_filter == "all" and request.user.is_staff):
-        boards_qs = boards_qs.filter(Q(owner=request.user) | Q(members=request.user)).distinct()
     sort = request.GET.get("sort") or "recent"
-    sort_map = {
-        "recent": "-created_at",
-        "alphabetic": "title",
-        "activity": "-created_at",
-    }
-    boards_qs = boards_qs.order_by(sort_map.get(sort, "-created_at"))
-    boards = _annotate_boards(boards_qs)
+    # Défilement infini : les pages suivantes sont demandées en XHR avec `after`
+    after = request.GET.get("after")
+    cursor = parse_board_cursor(after, sort) if after else None
+    if after and cursor is None:
+        return HttpResponseBadRequest("Invalid cursor.")
+    boards, next_cursor = page_boards(boards_qs, sort, after=cursor, limit=_board_page_size())
     context = {
         "boards": boards,
+        "next_cursor": next_cursor,
         "query": query,
         "owner_filter": owner_filter or "all",
         "sort": sort,
@@ -110,71 +133,101 @@ def board_list(request):
     return render(request, template_name, context)
 
 
+def _board_etag(request, board_id):
+    """
+    ETag de la page du tableau, calculé avant tout chargement : une lecture de
+    la version (tableau résolu par `board_view`), du compteur de notifications et du
+    numéro du dernier événement (repère de reprise du WebSocket). Pas d'ETag quand des messages flash attendent d'être affichés.
+    """
+    if len(messages.get_messages(request)):
+        return None
+    version = request.board_context.board.version
+    unread = request.user.notifications.filter(is_read=False).count()
+    # La page dépend aussi de l'utilisateur, des paramètres et du jeton CSRF
+    context = f"{request.user.pk}|{request.GET.urlencode()}|{unread}|{request.COOKIES.get('csrftoken', '')}"
+    seq = board_event_seq(board_id)
+    return f"b{board_id}-{version}-s{seq}-{hashlib.sha256(context.encode()).hexdigest()[:16]}"
+
+
 @login_required
+@board_view
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_board_etag)
 def board_detail(request, board_id):
-    _ensure_board_access(request, board_id)
     sort = request.GET.get("sort", "position")
-    sort_map = {
-        "title": "title",
-        "due_date": "due_date",
-        "created_at": "-created_at",
-        "position": "position",
-        "label": "labels__name",
-    }
-    order_by = sort_map.get(sort, "position")
-
-    cards_queryset = Card.objects.select_related("list").prefetch_related(
-        "labels", "subtasks", "comments"
-    )
-    if sort == "label":
-        cards_queryset = cards_queryset.annotate(
-            first_label=Min("labels__name")
-        ).order_by("first_label", "position")
+    filters = parse_card_filters(request.GET)
+    now = timezone.now()
+    # Lu avant le tableau : le client rejoue tout ce qui suit ce rendu
+    event_seq = board_event_seq(board_id)
+    if any(filters.values()):
+        board = build_board_snapshot(request.board_context.board, sort=sort, filters=filters)
     else:
-        cards_queryset = cards_queryset.order_by(order_by)
-
-    cards_prefetch = Prefetch("cards", queryset=cards_queryset)
-    lists_prefetch = Prefetch(
-        "lists",
-        queryset=List.objects.prefetch_related(cards_prefetch).order_by("position"),
-    )
-    # On remplace l'appel direct à get_object_or_404 par board_obj déjà récupéré
-    board = get_object_or_404(
-        Board.objects.select_related("owner").prefetch_related(lists_prefetch).filter(Q(owner=request.user) | Q(members=request.user)).distinct(),
-        pk=board_id,
-    )
-
-    raw_query = (request.GET.get("q") or "").strip()
-    query = raw_query.lower()
-    for board_list in board.lists.all():
-        cards_queryset = board_list.cards.all()
-        # Le filtrage IC contains sur le titre se fait en base de données si possible
-        # mais ici cards_queryset est déjà un QuerySet ordonné grâce au Prefetch
-        if query:
-            cards_queryset = cards_queryset.filter(title__icontains=query)
-        
-        cards = list(cards_queryset)
-        for card in cards:
-            subtasks = list(card.subtasks.all())
-            comments = list(card.comments.all())
-            card.total_subtasks = len(subtasks)
-            card.completed_subtasks = sum(1 for subtask in subtasks if subtask.is_completed)
-            card.comment_count = len(comments)
-        board_list.cached_cards = cards
+        # Sans filtre, les colonnes inchangées sont servies depuis le cache.
+        # En tri par position, seules les premières cartes sont rendues et la
+        # suite est chargée au défilement via list_cards.
+        board = load_board(request.board_context.board)
+        limit = _card_page_size() if sort == "position" else None
+        render_list_fragments(board.lists.all(), sort, now, limit=limit)
 
     # Get all labels used in this board
     board_labels = Label.objects.filter(cards__list__board_id=board_id).distinct()
 
     context = {
         "board": board,
-        "query": raw_query,
+        "query": filters["query"],
         "current_sort": sort,
         "board_labels": board_labels,
-        "now": timezone.now(),
+        "now": now,
+        "event_seq": event_seq,
     }
     return render(request, "boards/board_detail.html", context)
 
 
+def _card_page_size():
+    return getattr(settings, "BOARD_CARDS_PAGE_SIZE", 50)
+
+
+@login_required
+@board_view
+@require_http_methods(["GET"])
+def list_cards(request, board_id, list_id):
+    board_list = get_object_or_404(List, pk=list_id, board_id=board_id)
+    after = request.GET.get("after")
+    cursor = parse_cursor(after) if after else None
+    if after and cursor is None:
+        return HttpResponseBadRequest("Invalid cursor.")
+    try:
+        limit = int(request.GET.get("limit") or _card_page_size() or 50)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid limit.")
+    limit = max(1, min(limit, 200))
+    cards, next_cursor = page_cards(card_preview_queryset().filter(list=board_list), after=cursor, limit=limit)
+    return JsonResponse({
+        "list_id": board_list.id,
+        "cards": [serialize_card_preview(card) for card in cards],
+        "next_cursor": next_cursor,
+    })
+
+
+@login_required
+@board_view
+@require_http_methods(["GET"])
+def board_cards(request, board_id):
+    sort = request.GET.get("sort", "position")
+    board = build_board_snapshot(request.board_context.board, sort=sort, filters=parse_card_filters(request.GET))
+    return JsonResponse({
+        "board_id": board.id,
+        "lists": [
+            {
+                "id": board_list.id,
+                "title": board_list.title,
+                "cards": [serialize_card_preview(card) for card in board_list.cached_cards],
+            }
+            for board_list in board.lists.all()
+        ],
+    })
+
+
 @login_required
 def global_search(request):
     query = (request.GET.get("q") or "").strip()
@@ -183,16 +236,13 @@ def global_search(request):
 
     if query:
         # Boards accessibles par l'utilisateur dont le titre contient la requête
-        boards = Board.objects.filter(
-            Q(title__icontains=query),
-            Q(owner=request.user) | Q(members=request.user)
-        ).distinct().select_related("owner")
+        boards = accessible_boards(request.user).filter(title__icontains=query).select_related("owner")
 
         # Cards accessibles par l'utilisateur dont le titre ou la description contient la requête
         cards = Card.objects.filter(
             Q(title__icontains=query) | Q(description__icontains=query),
-            Q(list__board__owner=request.user) | Q(list__board__members=request.user)
-        ).distinct().select_related("list__board")
+            list__board__in=accessible_boards(request.user),
+        ).select_related("list__board")
 
     context = {
         "query": query,
@@ -203,26 +253,26 @@ def global_search(request):
 
 
 @login_required
+@board_view
 @require_POST
 def create_list(request, board_id):
-    _ensure_board_access(request, board_id)
-    board = get_object_or_404(Board, pk=board_id)
+    board = request.board_context.board
     title = (request.POST.get("title") or "").strip()
     if not title:
         return redirect("boards:board_detail", board_id=board.id)
 
-    max_position = board.lists.aggregate(max_pos=Max("position"))["max_pos"] or 0
-    List.objects.create(title=title, board=board, position=max_position + 1)
+    List.objects.create(title=title, board=board, position=append_position(board.lists.all()))
+    bump_board_version(board.id)
     messages.success(request, "Liste ajoutée avec succès.")
 
     return redirect("boards:board_detail", board_id=board.id)
 
 
 @login_required
+@board_view
 @require_POST
 def create_card(request, board_id):
-    _ensure_board_access(request, board_id)
-    board = get_object_or_404(Board, pk=board_id)
+    board = request.board_context.board
     list_id = request.POST.get("list_id")
     title = (request.POST.get("title") or "").strip()
     description = (request.POST.get("description") or "").strip()
@@ -231,101 +281,247 @@ def create_card(request, board_id):
         return redirect("boards:board_detail", board_id=board.id)
 
     board_list = get_object_or_404(List, pk=list_id, board=board)
-    max_position = board_list.cards.aggregate(max_pos=Max("position"))["max_pos"] or 0
     new_card = Card.objects.create(
         title=title,
         description=description,
         list=board_list,
-        position=max_position + 1,
+        position=append_position(board_list.cards.all()),
     )
-    _send_board_event(board.id, {"action": "card.created", "card": _card_response(new_card)})
+    _send_board_event(board.id, {"action": "card.created", "card": serialize_card_preview(new_card)}, list_ids=[board_list.id])
     messages.success(request, "Carte créée avec succès.")
     return redirect("boards:board_detail", board_id=board.id)
 
 
+def _move_neighbours(payload):
+    """Voisins `after_id` / `before_id` d'un déplacement ; ValueError s'ils sont invalides."""
+    after_id = int(payload["after_id"]) if payload.get("after_id") else None
+    before_id = int(payload["before_id"]) if payload.get("before_id") and not after_id else None
+    return after_id, before_id
+
+
+def _locate_move(item, siblings, moved_id, after_id, before_id, *fields):
+    """
+    Charge l'élément déplacé, ses champs `fields` et les bornes de sa nouvelle
+    place en une requête. Renvoie `(row, position, dense)`, row None si
+    l'élément n'existe pas. Sans place entre les voisins, les frères sont
+    renumérotés puis la place recalculée.
+    """
+    for attempt in range(2):
+        row = (
+            item.annotate(**move_annotations(siblings, moved_id, after_id, before_id))
+            .values(*fields, "anchor_position", "other_position")
+            .first()
+        )
+        if row is None or ((after_id or before_id) and row["anchor_position"] is None):
+            return row, None, False
+        position, dense = move_position(row["anchor_position"], row["other_position"], after_id, before_id)
+        if position is not None or attempt:
+            return row, position, dense
+        rebalance(siblings)
+
+
 @login_required
+@board_view
 @require_POST
 def reorder_lists(request, board_id):
-    _ensure_board_access(request, board_id)
-    board = get_object_or_404(Board, pk=board_id)
+    board = request.board_context.board
     try:
         payload = json.loads(request.body.decode("utf-8"))
     except (json.JSONDecodeError, UnicodeDecodeError):
         return HttpResponseBadRequest("Invalid JSON payload.")
+    if not isinstance(payload, dict):
+        return HttpResponseBadRequest("Invalid order format.")
+    if "list_id" in payload:
+        return _move_list(board, payload)
     order = payload.get("order")
     if not isinstance(order, list):
         return HttpResponseBadRequest("Invalid order format.")
-    with transaction.atomic():
-        for position, list_id in enumerate(order, start=1):
-            List.objects.filter(pk=list_id, board=board).update(position=position)
+    try:
+        list_ids = [int(list_id) for list_id in order]
+    except (TypeError, ValueError):
+        return HttpResponseBadRequest("Invalid list id.")
+    current = dict(board.lists.filter(pk__in=list_ids).values_list("id", "position"))
+    # Seules les listes qui changent de place sont écrites
+    changes, dense = plan_positions([list_id for list_id in list_ids if list_id in current], current)
+    if changes:
+        List.objects.bulk_update([List(pk=pk, position=position) for pk, position in changes.items()], ["position"])
+    if dense:
+        schedule_rebalance(List, board=board)
     _send_board_event(board.id, {"action": "lists.reordered", "order": order})
     return JsonResponse({"status": "ok"})
 
 
+def _move_list(board, payload):
+    """Déplacement d'une liste après `after_id` ou avant `before_id` (à la fin sans voisin) : une ligne écrite."""
+    try:
+        list_id = int(payload["list_id"])
+        after_id, before_id = _move_neighbours(payload)
+    except (TypeError, ValueError):
+        return HttpResponseBadRequest("Invalid list id.")
+    siblings = List.objects.filter(board=board)
+    row, position, dense = _locate_move(
+        siblings.filter(pk=list_id), siblings, list_id, after_id, before_id, "id"
+    )
+    if row is None:
+        raise Http404("No List matches the given query.")
+    if position is None:
+        return HttpResponseBadRequest("Neighbour list not found.")
+    List.objects.filter(pk=list_id).update(position=position)
+    if dense:
+        schedule_rebalance(List, board=board)
+    _send_board_event(board.id, {"action": "list.moved", "list_id": list_id, "after_id": after_id, "before_id": before_id})
+    return JsonResponse({"status": "ok", "position": position})
+
+
+@login_required
+@board_view
+@require_POST
+def move_card(request, board_id, card_id):
+    """
+    Déplace une carte dans `list_id`, juste après `after_id` ou juste avant
+    `before_id` (à la fin sans voisin). Une requête valide la carte, la liste
+    et le voisin ; seule la ligne de la carte est écrite et l'événement
+    `card.moved` ne dépend pas de la taille des listes.
+    """
+    payload = _get_payload(request)
+    try:
+        list_id = int(payload.get("list_id"))
+        after_id, before_id = _move_neighbours(payload)
+    except (TypeError, ValueError):
+        return HttpResponseBadRequest("Invalid list or card id.")
+    siblings = Card.objects.filter(list_id=list_id)
+    card = Card.objects.filter(pk=card_id, list__board_id=board_id).annotate(
+        target_list_id=Subquery(List.objects.filter(pk=list_id, board_id=board_id).values("id")[:1])
+    )
+    row, position, dense = _locate_move(
+        card, siblings, card_id, after_id, before_id, "list_id", "version", "target_list_id"
+    )
+    if row is None or row["target_list_id"] is None:
+        raise Http404("No Card matches the given query.")
+    if position is None:
+        return HttpResponseBadRequest("Neighbour card not found in target list.")
+    Card.objects.filter(pk=card_id).update(list_id=list_id, position=position, version=F("version") + 1)
+    if dense:
+        schedule_rebalance(Card, list_id=list_id)
+    version = row["version"] + 1
+    _send_board_event(
+        board_id,
+        {
+            "action": "card.moved",
+            "card_id": card_id,
+            "list_id": list_id,
+            "after_id": after_id,
+            "before_id": before_id,
+            "version": version,
+        },
+        list_ids=[row["list_id"], list_id],
+    )
+    return JsonResponse({"status": "ok", "position": position, "version": version})
+
+
 @login_required
+@board_view
 @require_POST
 def reorder_cards(request, board_id):
-    _ensure_board_access(request, board_id)
-    board = get_object_or_404(Board, pk=board_id)
+    board = request.board_context.board
 
     try:
         payload = json.loads(request.body.decode("utf-8"))
     except (json.JSONDecodeError, UnicodeDecodeError):
         return HttpResponseBadRequest("Invalid JSON payload.")
+    if not isinstance(payload, dict):
+        return HttpResponseBadRequest("Invalid JSON payload.")
 
     lists_payload = payload.get("lists")
     if not isinstance(lists_payload, list):
         return HttpResponseBadRequest("Invalid lists format.")
 
-    with transaction.atomic():
-        for list_item in lists_payload:
-            list_id = list_item.get("id")
-            card_ids = list_item.get("card_ids") or []
-            if not list_id or not isinstance(card_ids, list):
-                continue
-
-            board_list = List.objects.filter(pk=list_id, board=board).first()
-            if not board_list:
-                continue
-
+    # Placement demandé de chaque carte : id -> (liste, position)
+    wanted = {}
+    for list_item in lists_payload:
+        if not isinstance(list_item, dict):
+            continue
+        list_id = list_item.get("id")
+        card_ids = list_item.get("card_ids") or []
+        if not list_id or not isinstance(card_ids, list):
+            continue
+        try:
+            list_id = int(list_id)
             for position, card_id in enumerate(card_ids, start=1):
-                Card.objects.filter(pk=card_id, list__board=board).update(
-                    list=board_list,
-                    position=position,
-                )
-
-    _send_board_event(board.id, {"action": "cards.reordered", "lists": lists_payload})
+                wanted[int(card_id)] = (list_id, position)
+        except (TypeError, ValueError):
+            return HttpResponseBadRequest("Invalid card or list id.")
+
+    # Appartenance au tableau des cartes et des listes de destination : une
+    # seule requête (UNION ALL), quel que soit le nombre de cartes. Les lignes
+    # de listes n'ont pas d'id de carte. Les ids étrangers sont ignorés.
+    no_value = Value(None, output_field=IntegerField())
+    cards = Card.objects.filter(pk__in=wanted, list__board=board).order_by()
+    lists = List.objects.filter(board=board, pk__in={list_id for list_id, _ in wanted.values()}).order_by()
+    rows = cards.values_list("id", "list_id", "position").union(
+        lists.values_list(no_value, "id", no_value), all=True
+    )
+    board_list_ids = set()
+    current = {}
+    for card_id, list_id, position in rows:
+        if card_id is None:
+            board_list_ids.add(list_id)
+        else:
+            current[card_id] = (list_id, position)
+    # Par liste, les cartes déjà dans l'ordre voulu gardent leur position : un
+    # déplacement n'écrit qu'une ligne. Le reste est écrit en une instruction
+    # UPDATE ... CASE (par lot si la base limite le nombre de paramètres).
+    moved = []
+    for list_id in board_list_ids:
+        ids = sorted(
+            (card_id for card_id in current if wanted[card_id][0] == list_id),
+            key=lambda card_id: wanted[card_id][1],
+        )
+        in_list = {card_id: current[card_id][1] for card_id in ids if current[card_id][0] == list_id}
+        changes, dense = plan_positions(ids, in_list)
+        moved.extend(Card(pk=card_id, list_id=list_id, position=position) for card_id, position in changes.items())
+        if dense:
+            schedule_rebalance(Card, list_id=list_id)
+    if moved:
+        Card.objects.bulk_update(moved, ["list", "position"])
+    # Les listes d'origine des cartes déplacées changent aussi
+    touched_list_ids = {card.list_id for card in moved} | {current[card.pk][0] for card in moved}
+
+    _send_board_event(board.id, {"action": "cards.reordered", "lists": lists_payload}, list_ids=touched_list_ids)
     return JsonResponse({"status": "ok"})
 
 
 @login_required
+@board_view
 @require_POST
 def rename_board(request, board_id):
-    _ensure_board_access(request, board_id)
-    board = get_object_or_404(Board, pk=board_id)
+    board = request.board_context.board
     title = (request.POST.get("title") or "").strip()
     if title:
         board.title = title
         board.save(update_fields=["title"])
+        bump_board_version(board.id)
         messages.success(request, "Tableau renommé.")
     return redirect("boards:board_list")
 
 
 @login_required
+@board_view
 @require_POST
 def delete_board(request, board_id):
-    _ensure_board_access(request, board_id)
-    board = get_object_or_404(Board, pk=board_id)
+    board = request.board_context.board
     board.delete()
+    invalidate_board_access(board_id)
+    dispatch_access_revoked(board_id)
     messages.success(request, "Tableau supprimé.")
     return redirect("boards:board_list")
 
 
 @login_required
+@board_view
 @require_POST
 def delete_list(request, board_id, list_id):
-    _ensure_board_access(request, board_id)
-    board = get_object_or_404(Board, pk=board_id)
+    board = request.board_context.board
     board_list = get_object_or_404(List, pk=list_id, board=board)
     list_id_val = board_list.id
     board_list.delete()
@@ -346,6 +542,7 @@ def _get_payload(request):
 def _card_queryset():
     return Card.objects.select_related("list__board").prefetch_related(
         "labels",
+        "assigned_to",
         "subtasks",
         "checklists",
         "checklists__items",
@@ -356,117 +553,81 @@ def _card_queryset():
     )
 
 
-def _card_response(card):
-    labels = [
-        {"id": label.id, "name": label.name, "color": label.color}
-        for label in card.labels.all()
-    ]
-    label_ids = {label["id"] for label in labels}
-    available_labels = [
-        {
-            "id": label.id,
-            "name": label.name,
-            "color": label.color,
-            "assigned": label.id in label_ids,
-        }
-        for label in Label.objects.order_by("name")
-    ]
-    
-    # New checklists structure
-    checklists = []
-    for cl in card.checklists.all():
-        items = [
-            {"id": item.id, "title": item.title, "is_completed": item.is_completed}
-            for item in cl.items.all()
-        ]
-        total = len(items)
-        completed = sum(1 for item in items if item["is_completed"])
-        percent = int((completed / total * 100)) if total > 0 else 0
-        checklists.append({
-            "id": cl.id,
-            "title": cl.title,
-            "items": items,
-            "total_items": total,
-            "completed_items": completed,
-            "percent": percent
-        })
-
-    # Legacy subtasks (without checklist)
-    standalone_subtasks = [
-        {"id": subtask.id, "title": subtask.title, "is_completed": subtask.is_completed}
-        for subtask in card.subtasks.all() if subtask.checklist_id is None
-    ]
-    
-    all_subtasks = [
-        {"id": s.id, "is_completed": s.is_completed}
-        for s in card.subtasks.all()
-    ]
-    
-    comments = [
-        {
-            "id": comment.id,
-            "author": comment.author.get_full_name() or comment.author.username,
-            "content": comment.content,
-            "created_at": comment.created_at.strftime("%d/%m/%Y %H:%M"),
-        }
-        for comment in card.comments.all()
-    ]
-
-    assigned_users = [
-        {"id": u.id, "username": u.username, "initial": u.username[0].upper()}
-        for u in card.assigned_to.all()
-    ]
-    assigned_ids = {u["id"] for u in assigned_users}
-    board = card.list.board
-    members = [
-        {
-            "id": u.id,
-            "username": u.username,
-            "initial": u.username[0].upper(),
-            "is_assigned": u.id in assigned_ids
-        }
-        for u in User.objects.filter(Q(owned_boards=board) | Q(joined_boards=board)).distinct().order_by("username")
-    ]
-
-    return {
-        "id": card.id,
-        "board_id": card.list.board_id,
-        "list_id": card.list_id,
-        "title": card.title,
-        "description": card.description or "",
-        "due_date": card.due_date.isoformat() if card.due_date else None,
-        "due_date_display": timezone.localtime(card.due_date).strftime("%d/%m/%Y %H:%M") if card.due_date else "",
-        "due_date_local": timezone.localtime(card.due_date).strftime("%Y-%m-%dT%H:%M") if card.due_date else "",
-        "labels": labels,
-        "available_labels": available_labels,
-        "checklists": checklists,
-        "subtasks": standalone_subtasks, # compatibility
-        "completed_subtasks": sum(1 for s in all_subtasks if s["is_completed"]),
-        "total_subtasks": len(all_subtasks),
-        "comments": comments,
-        "comment_count": len(comments),
-        "assigned_users": assigned_users,
-        "members": members,
-    }
-
-
 def _get_card(board_id, card_id):
     return get_object_or_404(_card_queryset(), pk=card_id, list__board_id=board_id)
 
 
+def _get_accessible_card(request, board_id, card_id):
+    """Carte d'un tableau accessible à l'utilisateur (rôle résolu pour la requête, puis une requête)."""
+    resolve_board(request, board_id)
+    return get_object_or_404(Card.objects.select_related("list__board"), pk=card_id, list__board_id=board_id)
+
+
+def _card_etag(request, board_id, card_id):
+    """ETag du détail d'une carte (accès vérifié par `board_view`) : une requête indexée, sans préchargement."""
+    versions = (
+        Card.objects.filter(pk=card_id, list__board_id=board_id)
+        .values_list("version", "list__board__version")
+        .first()
+    )
+    if versions is None:
+        return None
+    card_version, board_version = versions
+    return f"c{card_id}-{card_version}-b{board_version}-l{labels_version()}"
+
+
 @login_required
+@board_view
 @require_http_methods(["GET"])
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_card_etag)
 def card_detail(request, board_id, card_id):
-    _ensure_board_access(request, board_id)
     card = _get_card(board_id, card_id)
-    return JsonResponse(_card_response(card))
+    return JsonResponse(serialize_card_detail(card))
+
+
+def card_mutation(view=None, *, fields=None, with_catalog=False):
+    """
+    Pipeline commun des endpoints qui modifient une carte.
+
+    Contrôle d'accès (rôle résolu pour la requête) et chargement de la carte en
+    une requête, puis la
+    vue applique sa modification sur cette carte (sans préchargement) et ne
+    renvoie une réponse qu'en cas d'erreur. La carte est ensuite rechargée une
+    fois, sérialisée une fois, et ce même résultat sert à la diffusion et à la
+    réponse HTTP.
+
+    `fields` liste les champs d'aperçu que la vue peut modifier : seuls ceux-ci
+    sont diffusés (delta versionné, voir `card_delta`). `with_catalog` ajoute
+    le catalogue labels / membres à la réponse, pour les modifications qui le
+    changent.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, board_id, card_id, *args, **kwargs):
+            card = _get_accessible_card(request, board_id, card_id)
+            error = view(request, card, *args, **kwargs)
+            if error is not None:
+                return error
+            # Versions incrémentées avant le rechargement : le delta porte la nouvelle
+            bump_board_version(board_id, [card.list_id], [card.id])
+            updated = _get_card(board_id, card_id)
+            data = serialize_card_detail(updated) if with_catalog else serialize_card(updated)
+            dispatch_board_event(board_id, {"action": "card.updated", "card": card_delta(data, fields)})
+            return JsonResponse(data)
+        return wrapper
+
+    return decorator(view) if view else decorator
+
+
+# Champs d'aperçu touchés par les sous-tâches et checklists
+SUBTASK_FIELDS = ("completed_subtasks", "total_subtasks")
 
 
 @login_required
 @require_POST
-def update_card(request, board_id, card_id):
-    _ensure_board_access(request, board_id)
-    card = _get_card(board_id, card_id)
+@card_mutation(fields=("title", "description", "due_date", "due_date_display"))
+def update_card(request, card):
     payload = _get_payload(request)
     title = (payload.get("title") or "").strip()
     if not title:
@@ -485,16 +646,12 @@ def update_card(request, board_id, card_id):
     card.title = title
     card.description = description
     card.save(update_fields=["title", "description", "due_date"])
-    updated = _get_card(board_id, card_id)
-    _send_board_event(board_id, {"action": "card.updated", "card": _card_response(updated)})
-    return JsonResponse(_card_response(updated))
 
 
 @login_required
 @require_POST
-def toggle_card_label(request, board_id, card_id):
-    _ensure_board_access(request, board_id)
-    card = _get_card(board_id, card_id)
+@card_mutation(fields=("labels",))
+def toggle_card_label(request, card):
     payload = _get_payload(request)
     label_id = payload.get("label_id")
     if not label_id:
@@ -504,16 +661,12 @@ def toggle_card_label(request, board_id, card_id):
         card.labels.remove(label)
     else:
         card.labels.add(label)
-    updated = _get_card(board_id, card_id)
-    _send_board_event(board_id, {"action": "card.updated", "card": _card_response(updated)})
-    return JsonResponse(_card_response(updated))
 
 
 @login_required
 @require_POST
-def create_subtask(request, board_id, card_id):
-    _ensure_board_access(request, board_id)
-    card = _get_card(board_id, card_id)
+@card_mutation(fields=SUBTASK_FIELDS)
+def create_subtask(request, card):
     payload = _get_payload(request)
     title = (payload.get("title") or "").strip()
     checklist_id = payload.get("checklist_id")
@@ -525,83 +678,59 @@ def create_subtask(request, board_id, card_id):
         checklist = get_object_or_404(Checklist, pk=checklist_id, card=card)
     
     Subtask.objects.create(card=card, checklist=checklist, title=title)
-    updated = _get_card(board_id, card_id)
-    _send_board_event(board_id, {"action": "card.updated", "card": _card_response(updated)})
-    return JsonResponse(_card_response(updated))
 
 
 @login_required
 @require_POST
-def create_checklist(request, board_id, card_id):
-    _ensure_board_access(request, board_id)
-    card = _get_card(board_id, card_id)
+@card_mutation(fields=())
+def create_checklist(request, card):
     payload = _get_payload(request)
     title = (payload.get("title") or "Checklist").strip()
     Checklist.objects.create(card=card, title=title)
-    updated = _get_card(board_id, card_id)
-    _send_board_event(board_id, {"action": "card.updated", "card": _card_response(updated)})
-    return JsonResponse(_card_response(updated))
 
 
 @login_required
 @require_POST
-def delete_checklist(request, board_id, card_id, checklist_id):
-    _ensure_board_access(request, board_id)
-    card = _get_card(board_id, card_id)
+@card_mutation(fields=SUBTASK_FIELDS)
+def delete_checklist(request, card, checklist_id):
     checklist = get_object_or_404(Checklist, pk=checklist_id, card=card)
     checklist.delete()
-    updated = _get_card(board_id, card_id)
-    _send_board_event(board_id, {"action": "card.updated", "card": _card_response(updated)})
-    return JsonResponse(_card_response(updated))
 
 
 @login_required
 @require_POST
-def toggle_subtask(request, board_id, card_id, subtask_id):
-    _ensure_board_access(request, board_id)
-    card = _get_card(board_id, card_id)
+@card_mutation(fields=SUBTASK_FIELDS)
+def toggle_subtask(request, card, subtask_id):
     subtask = get_object_or_404(Subtask, pk=subtask_id, card=card)
     subtask.is_completed = not subtask.is_completed
     subtask.save(update_fields=["is_completed"])
-    updated = _get_card(board_id, card_id)
-    _send_board_event(board_id, {"action": "card.updated", "card": _card_response(updated)})
-    return JsonResponse(_card_response(updated))
 
 
 @login_required
 @require_POST
-def delete_subtask(request, board_id, card_id, subtask_id):
-    _ensure_board_access(request, board_id)
-    card = _get_card(board_id, card_id)
+@card_mutation(fields=SUBTASK_FIELDS)
+def delete_subtask(request, card, subtask_id):
     subtask = get_object_or_404(Subtask, pk=subtask_id, card=card)
     subtask.delete()
-    updated = _get_card(board_id, card_id)
-    _send_board_event(board_id, {"action": "card.updated", "card": _card_response(updated)})
-    return JsonResponse(_card_response(updated))
 
 
 @login_required
 @require_POST
-def create_comment(request, board_id, card_id):
-    _ensure_board_access(request, board_id)
+@card_mutation(fields=("comment_count",))
+def create_comment(request, card):
     if not request.user.is_authenticated:
         return JsonResponse({"error": "Authentification requise."}, status=403)
-    card = _get_card(board_id, card_id)
     payload = _get_payload(request)
     content = (payload.get("content") or "").strip()
     if not content:
         return HttpResponseBadRequest("Le commentaire est requis.")
     Comment.objects.create(card=card, author=request.user, content=content)
-    updated = _get_card(board_id, card_id)
-    _send_board_event(board_id, {"action": "card.updated", "card": _card_response(updated)})
-    return JsonResponse(_card_response(updated))
 
 
 @login_required
 @require_POST
-def create_label(request, board_id, card_id):
-    _ensure_board_access(request, board_id)
-    card = _get_card(board_id, card_id)
+@card_mutation(fields=("labels",), with_catalog=True)  # le catalogue des labels change
+def create_label(request, card):
     payload = _get_payload(request)
     name = (payload.get("name") or "").strip()
     color = (payload.get("color") or "#3b82f6").strip()
@@ -611,46 +740,40 @@ def create_label(request, board_id, card_id):
         color = "#3b82f6"
     label = Label.objects.create(name=name, color=color)
     card.labels.add(label)
-    updated = _get_card(board_id, card_id)
-    _send_board_event(board_id, {"action": "card.updated", "card": _card_response(updated)})
-    return JsonResponse(_card_response(updated))
+    bump_labels_version()  # invalide aussi le catalogue de chaque tableau
 
 
 @login_required
 @require_POST
-def delete_label(request, board_id, card_id, label_id):
-    _ensure_board_access(request, board_id)
-    card = _get_card(board_id, card_id)
+@card_mutation(fields=("labels",), with_catalog=True)  # le label peut disparaître du catalogue
+def delete_label(request, card, label_id):
     label = get_object_or_404(Label, pk=label_id)
     card.labels.remove(label)
     if not label.cards.exists():
         label.delete()
-    updated = _get_card(board_id, card_id)
-    _send_board_event(board_id, {"action": "card.updated", "card": _card_response(updated)})
-    return JsonResponse(_card_response(updated))
+        bump_labels_version()
 
 
 @login_required
 @require_POST
 def delete_card(request, board_id, card_id):
-    _ensure_board_access(request, board_id)
-    card = _get_card(board_id, card_id)
+    card = _get_accessible_card(request, board_id, card_id)
     card_id_value = card.id
     card.delete()
-    _send_board_event(board_id, {"action": "card.deleted", "card_id": card_id_value})
+    _send_board_event(board_id, {"action": "card.deleted", "card_id": card_id_value}, list_ids=[card.list_id])
     return JsonResponse({"status": "deleted", "card_id": card_id_value})
 
 
 @login_required
 @require_POST
-def toggle_card_assignment(request, board_id, card_id):
-    _ensure_board_access(request, board_id)
-    card = _get_card(board_id, card_id)
+@card_mutation(fields=("assigned_users",))
+def toggle_card_assignment(request, card):
+    board_id = card.list.board_id
     payload = _get_payload(request)
     user_id = payload.get("user_id")
     if not user_id:
         return HttpResponseBadRequest("user_id requis.")
-    user_to_assign = get_object_or_404(User, Q(owned_boards__id=board_id) | Q(joined_boards__id=board_id), pk=user_id)
+    user_to_assign = get_object_or_404(User, board_accesses__board_id=board_id, pk=user_id)
     if card.assigned_to.filter(pk=user_to_assign.id).exists():
         card.assigned_to.remove(user_to_assign)
     else:
@@ -661,9 +784,15 @@ def toggle_card_assignment(request, board_id, card_id):
                 message=f"Vous avez été assigné à la carte '{card.title}'",
                 link=reverse("boards:board_detail", kwargs={"board_id": board_id})
             )
-    updated = _get_card(board_id, card_id)
-    _send_board_event(board_id, {"action": "card.updated", "card": _card_response(updated)})
-    return JsonResponse(_card_response(updated))
+
+
+@login_required
+@require_http_methods(["GET"])
+def realtime_metrics(request):
+    """Files d'envoi des WebSockets de ce processus (réservé au staff)."""
+    if not request.user.is_staff:
+        raise Http404
+    return JsonResponse(send_queue_metrics())
 
 
 @login_required
@@ -679,10 +808,11 @@ def create_board(request):
 
 
 @login_required
+@board_view
 @require_POST
 def invite_member(request, board_id):
-    board = _ensure_board_access(request, board_id)
-    if request.user != board.owner:
+    board = request.board_context.board
+    if not request.board_context.is_owner:
         messages.error(request, "Seul le propriétaire peut inviter des membres.")
         return redirect("boards:board_detail", board_id=board.id)
     username = (request.POST.get("username") or "").strip()
@@ -696,10 +826,13 @@ def invite_member(request, board_id):
         messages.error(request, f"L'utilisateur '{username}' n'existe pas.")
         return redirect("boards:board_detail", board_id=board.id)
 
-    if user_to_invite == board.owner or board.members.filter(pk=user_to_invite.pk).exists():
+    if board.accesses.filter(user=user_to_invite).exists():
         messages.info(request, f"{username} est déjà membre de ce tableau.")
     else:
+        # BoardAccess et les rôles en cache suivent (boards.signals)
         board.members.add(user_to_invite)
+        bump_board_version(board.id)
+        invalidate_board_catalog(board)
         Notification.objects.create(
             user=user_to_invite,
             message=f"Vous avez été invité au tableau '{board.title}' par {request.user.username}",
@@ -711,9 +844,10 @@ def invite_member(request, board_id):
 
 
 @login_required
+@board_view
 def manage_members(request, board_id):
-    board = _ensure_board_access(request, board_id)
-    if request.user != board.owner:
+    board = request.board_context.board
+    if not request.board_context.is_owner:
         messages.error(request, "Seul le propriétaire peut gérer les membres.")
         return redirect("boards:board_detail", board_id=board.id)
     
@@ -725,15 +859,24 @@ def manage_members(request, board_id):
 
 
 @login_required
+@board_view
 @require_POST
 def remove_member(request, board_id, user_id):
-    board = _ensure_board_access(request, board_id)
-    if request.user != board.owner:
+    if not request.board_context.is_owner:
         return JsonResponse({"error": "Action non autorisée."}, status=403)
+    board = request.board_context.board
     
     user_to_remove = get_object_or_404(User, pk=user_id)
+    if user_to_remove.pk == board.owner_id:
+        return JsonResponse({"error": "Le propriétaire ne peut pas être retiré du tableau."}, status=400)
+    if not board.members.filter(pk=user_to_remove.pk).exists():
+        return JsonResponse({"error": f"{user_to_remove.username} n'est pas membre du tableau."}, status=400)
     board.members.remove(user_to_remove)
-    
+    bump_board_version(board.id)
+    invalidate_board_catalog(board)
+    # Les sockets ouvertes du membre retiré sont fermées (4403)
+    dispatch_access_revoked(board.id, user_to_remove.pk)
+
     return JsonResponse({"status": "ok", "message": f"{user_to_remove.username} retiré du tableau."})
 
 
@@ -751,15 +894,9 @@ def home(request):
         "preview_cards": [1, 2],
     }
     if request.user.is_authenticated:
-        boards_qs = (
-            Board.objects.filter(owner=request.user)
-            .select_related("owner")
-            .prefetch_related(
-                Prefetch("lists", queryset=List.objects.prefetch_related("cards"))
-            )
-            .order_by("-created_at")
-        )
-        context["boards"] = _annotate_boards(boards_qs)
+        boards_qs = annotate_board_counts(Board.objects.filter(owner=request.user).select_related("owner"))
+        # Derniers tableaux : première page seulement, « Tous les tableaux » mène à la suite
+        context["boards"], _ = page_boards(boards_qs, "recent", limit=_board_page_size())
     return render(request, "boards/home.html", context)
 
 
@@ -828,20 +965,20 @@ def mark_all_notifications_read(request):
 
 
 @login_required
+@board_view
 def export_board(request, board_id, export_format):
-    board = _ensure_board_access(request, board_id)
-    
-    # Eager load all related data
-    board = Board.objects.prefetch_related(
+    # Eager load all related data (owner déjà chargé avec le tableau)
+    board = request.board_context.board
+    prefetch_related_objects(
+        [board],
         Prefetch('lists', queryset=List.objects.prefetch_related(
             Prefetch('cards', queryset=Card.objects.prefetch_related(
                 'assigned_to', 'labels', 'subtasks', 
                 Prefetch('comments', queryset=Comment.objects.select_related('author'))
             ).order_by('position'))
         ).order_by('position')),
-        'owner',
         'members'
-    ).get(pk=board_id)
+    )
 
     if export_format == "json":
         board_data = {
@@ -233,7 +233,12 @@ if REDIS_URL:
     CHANNEL_LAYERS = {
         "default": {
             "BACKEND": "channels_redis.core.RedisChannelLayer",
-            "CONFIG": {"hosts": [REDIS_URL]},
+            "CONFIG": {
+                "hosts": [REDIS_URL],
+                # Les consumers renouvellent leur appartenance à chaque battement
+                # de cœur : un membre dont le processus a disparu expire vite
+                "group_expiry": int(getenv("CHANNEL_GROUP_EXPIRY", "300")),
+            },
         }
     }
 else:
@@ -242,6 +247,76 @@ else:
         "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
     }
 
+# Diffusion des événements de tableau par un thread d'arrière-plan après le
+# commit. Désactivée par défaut sans Redis : l'InMemoryChannelLayer est lié à
+# la boucle du serveur, l'envoi se fait alors dans le callback on_commit.
+BOARD_EVENTS_ASYNC = getenv("BOARD_EVENTS_ASYNC", "1" if REDIS_URL else "0") == "1"
+
+# Fenêtre (ms) de regroupement des événements en une trame par WebSocket ; 0 désactive
+BOARD_WS_COALESCE_MS = int(getenv("BOARD_WS_COALESCE_MS", "50"))
+
+# Battements de cœur du serveur : ping toutes les BOARD_WS_HEARTBEAT_INTERVAL
+# secondes, connexion fermée (4408) et retirée de son groupe sans message du
+# client depuis BOARD_WS_IDLE_TIMEOUT secondes ; 0 désactive
+BOARD_WS_HEARTBEAT_INTERVAL = float(getenv("BOARD_WS_HEARTBEAT_INTERVAL", "25"))
+BOARD_WS_IDLE_TIMEOUT = float(getenv("BOARD_WS_IDLE_TIMEOUT", "60"))
+
+# File d'envoi par WebSocket : au-delà de BOARD_WS_SEND_QUEUE_SIZE événements en
+# attente (client lent), politique appliquée : "coalesce" (fusion, puis resync),
+# "resync" (signal de rechargement) ou "disconnect" (fermeture 4429, reprise)
+BOARD_WS_SEND_QUEUE_SIZE = int(getenv("BOARD_WS_SEND_QUEUE_SIZE", "200"))
+BOARD_WS_SEND_QUEUE_POLICY = getenv("BOARD_WS_SEND_QUEUE_POLICY", "coalesce")
+
+# Journal des derniers événements par tableau, rejoués à la reconnexion d'un
+# WebSocket (`resume_from`) ; au-delà, le client recharge le tableau
+BOARD_EVENT_LOG_SIZE = int(getenv("BOARD_EVENT_LOG_SIZE", "500"))
+BOARD_EVENT_LOG_TIMEOUT = int(getenv("BOARD_EVENT_LOG_TIMEOUT", "3600"))
+
+# Cache (colonnes de cartes rendues, versions). Redis/Valkey si disponible,
+# sinon cache mémoire local au processus.
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    # Une clé par événement journalisé : la limite par défaut de Django (300
+    # entrées) évincerait le journal d'un seul tableau actif et son compteur
+    # `seq`. Par défaut, place pour les journaux complets d'une quarantaine de
+    # tableaux, colonnes rendues, catalogues et rôles compris.
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {
+                "MAX_ENTRIES": int(getenv("LOCMEM_CACHE_MAX_ENTRIES", str(max(BOARD_EVENT_LOG_SIZE * 40, 10000)))),
+            },
+        }
+    }
+
+# Durée de vie (secondes) des colonnes de cartes rendues ; 0 désactive le cache
+BOARD_FRAGMENT_CACHE_TIMEOUT = int(getenv("BOARD_FRAGMENT_CACHE_TIMEOUT", "300"))
+
+# Durée de vie (secondes) du catalogue labels / membres d'un tableau
+BOARD_CATALOG_CACHE_TIMEOUT = int(getenv("BOARD_CATALOG_CACHE_TIMEOUT", "3600"))
+
+# Renumérotation des positions (listes, cartes) devenues trop serrées : dans un
+# thread d'arrière-plan après le commit, ou directement dans le callback si 0.
+# Désactivée par défaut sans Redis, comme BOARD_EVENTS_ASYNC : sur la
+# configuration SQLite de développement, un second thread d'écriture entre en
+# concurrence avec la transaction de la requête.
+BOARD_POSITIONS_ASYNC_REBALANCE = getenv("BOARD_POSITIONS_ASYNC_REBALANCE", "1" if REDIS_URL else "0") == "1"
+
+# Cartes rendues par colonne avant chargement au défilement ; 0 rend tout
+BOARD_CARDS_PAGE_SIZE = int(getenv("BOARD_CARDS_PAGE_SIZE", "50"))
+
+# Tableaux par page de la liste des tableaux (suite chargée au défilement)
+BOARD_LIST_PAGE_SIZE = int(getenv("BOARD_LIST_PAGE_SIZE", "24"))
+
+# Durée de vie (secondes) du rôle d'un utilisateur sur un tableau (vues et WebSocket)
+BOARD_ACCESS_CACHE_TIMEOUT = int(getenv("BOARD_ACCESS_CACHE_TIMEOUT", "300"))
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,